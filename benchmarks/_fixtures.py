@@ -0,0 +1,37 @@
+from marcel import Marcel
+from marcel.stats import LatencyStats
+import asyncio
+
+"""
+    Shared fixtures of the benchmarks for Marcel the Discord Bot
+"""
+
+def make_bot(loop: asyncio.AbstractEventLoop = None, **overrides) -> Marcel:
+    """Return a Marcel instance with the plugin, command and event state of
+    Marcel.__init__ but no configuration nor Discord connection
+    loop: event loop of the instance (None to leave it unset)
+    overrides: attributes to set on the instance"""
+
+    marcel = Marcel.__new__(Marcel)
+    marcel.plugins = dict()
+    marcel.commands = dict()
+    marcel.command_table = dict()
+    marcel.event_handlers = dict()
+    marcel.event_funcs = dict()
+    marcel.event_tasks = set()
+    marcel.gateway_intents = None
+    marcel.staged_event_handlers = dict()
+    marcel.latency_stats = LatencyStats()
+    marcel.lazy_plugins = False
+    marcel.plugin_load_timeout = 30.0
+    marcel.concurrent_events = False
+    marcel.event_handler_timeout = None
+    marcel.event_sample_interval = 16
+
+    if loop is not None:
+        marcel.loop = loop
+
+    for name, value in overrides.items():
+        setattr(marcel, name, value)
+
+    return marcel
@@ -0,0 +1,97 @@
+from pathlib import Path
+from marcel import Marcel
+from _fixtures import make_bot
+import random
+import tempfile
+import timeit
+
+"""
+    Command dispatch microbenchmark for Marcel the Discord Bot
+
+    Compares the per-message cost of resolving a command through the
+    precompiled dispatch table against the previous lookup path
+    (commands -> plugins -> getattr, then a second commands lookup for the
+    clean_command attribute).
+
+    Usage: PYTHONPATH=. python3 benchmarks/bench_dispatch.py [plugins] [commands per plugin]
+"""
+
+plugin_source = """
+class MarcelPlugin:
+    plugin_name = "Plugin {index}"
+    bot_commands = [{commands}]
+
+    def __init__(self, marcel):
+        self.marcel = marcel
+
+{functions}
+"""
+
+def write_plugins(path: Path, plugin_count: int, command_count: int) -> None:
+    for i in range(plugin_count):
+        commands = list()
+        functions = list()
+
+        for j in range(command_count):
+            commands.append("(\"cmd-{0}-{1}\", \"cmd_{0}_{1}\", \"clean_command\")".format(i, j))
+            functions.append("    async def cmd_{}_{}(self, message, args, **kwargs):\n        pass\n".format(i, j))
+
+        path.joinpath("plugin_{}.py".format(i)).write_text(plugin_source.format(
+            index=i,
+            commands=", ".join(commands),
+            functions="\n".join(functions)
+        ))
+
+def legacy_dispatch(marcel: Marcel, command: str):
+    command_info = marcel.commands.get(command)
+
+    if command_info:
+        plugin = marcel.plugins.get(command_info["plugin_name"], dict())
+        func = getattr(plugin.get("module"), command_info["function_name"])
+        clean = "clean_command" in marcel.commands.get(command).get("attributes")
+        return func, clean
+
+    return None
+
+def table_dispatch(marcel: Marcel, command: str):
+    entry = marcel.command_table.get(command)
+
+    if entry:
+        return entry.func, entry.clean_command
+
+    return None
+
+def main(plugin_count: int = 50, command_count: int = 12, iterations: int = 1000000):
+    marcel = make_bot()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        write_plugins(Path(tmpdir), plugin_count, command_count)
+        marcel.plugins_path = Path(tmpdir)
+        marcel.load_plugins()
+
+    names = list(marcel.commands) + ["unknown-{}".format(i) for i in range(len(marcel.commands) // 10)]
+    random.seed(0)
+    requests = [random.choice(names) for _ in range(4096)]
+
+    print("{} plugins, {} commands, {} dispatches".format(
+        len(marcel.plugins),
+        len(marcel.command_table),
+        iterations
+    ))
+
+    for label, func in (("legacy", legacy_dispatch), ("table", table_dispatch)):
+        timer = timeit.Timer(
+            "for command in requests: dispatch(marcel, command)",
+            globals={"requests": requests, "dispatch": func, "marcel": marcel}
+        )
+        loops = max(1, iterations // len(requests))
+        best = min(timer.repeat(repeat=5, number=loops))
+        print("{:>8}: {:.1f} ns/dispatch".format(
+            label,
+            best / (loops * len(requests)) * 1e9
+        ))
+
+if __name__ == "__main__":
+    import sys
+
+    main(*[int(x) for x in sys.argv[1:3]])
@@ -0,0 +1,84 @@
+from marcel import Marcel
+from _fixtures import make_bot
+import asyncio
+import time
+import types
+
+"""
+    Event dispatch benchmark for Marcel the Discord Bot
+
+    Measures events/second through the on_* wrappers with 0, 1 and 10
+    subscribers, using the cached handler tuples and the previous
+    per-event list building.
+
+    Usage: PYTHONPATH=. python3 benchmarks/bench_events.py [events]
+"""
+
+class Subscriber:
+    def __init__(self, name: str):
+        self.plugin_name = name
+
+    async def on_typing(self, channel, user, when):
+        pass
+
+async def legacy_on_typing(self, channel, user, when) -> None:
+    for func in legacy_get_event_handler_functions(self, "on_typing"):
+        await func(channel, user, when)
+
+def legacy_get_event_handler_functions(self, event_name: str) -> list:
+    funcs = list()
+    handlers = self.event_handlers.get(event_name)
+
+    if handlers:
+        for handler in handlers:
+            plugin = self.plugins.get(handler["plugin_name"], dict())
+            func = getattr(plugin.get("module"), handler["function_name"])
+            if func:
+                funcs.append(func)
+
+    return funcs
+
+def create_marcel(loop: asyncio.AbstractEventLoop, subscribers: int) -> Marcel:
+    marcel = make_bot(loop)
+
+    for i in range(subscribers):
+        plugin = Subscriber("Subscriber {}".format(i))
+        marcel.plugins[plugin.plugin_name] = {"module": plugin, "filepath": None}
+        marcel.register_event_handler(plugin, "on_typing", "on_typing")
+
+    return marcel
+
+async def run_events(marcel: Marcel, count: int) -> float:
+    start = time.perf_counter()
+
+    for _ in range(count):
+        await marcel.on_typing(None, None, None)
+
+    return count / (time.perf_counter() - start)
+
+def main(count: int = 200000):
+    loop = asyncio.new_event_loop()
+
+    for subscribers in (0, 1, 10):
+        results = list()
+
+        for legacy in (True, False):
+            marcel = create_marcel(loop, subscribers)
+            if legacy:
+                marcel.on_typing = types.MethodType(legacy_on_typing, marcel)
+
+            results.append(max(
+                loop.run_until_complete(run_events(marcel, count)) for _ in range(3)
+            ))
+
+        print("{:>2} subscribers: legacy {:>10.0f} events/s, cached {:>10.0f} events/s".format(
+            subscribers,
+            *results
+        ))
+
+    loop.close()
+
+if __name__ == "__main__":
+    import sys
+
+    main(*[int(x) for x in sys.argv[1:2]])
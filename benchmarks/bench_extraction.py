@@ -0,0 +1,154 @@
+from bench_ytdl_pool import serve
+from marcel.voice import MarcelMediaPlayer, ExtractionPool
+import asyncio
+import tempfile
+import threading
+import statistics
+import logging
+import time
+import sys
+import os
+
+"""
+    youtube-dl extraction isolation benchmark for Marcel the Discord Bot
+
+    Runs concurrent extractions (all at once, the scheduler's limit is
+    raised) in the event loop's thread pool and in an ExtractionPool, and
+    measures meanwhile:
+    - the event loop lag (how late a 10ms sleep wakes up)
+    - the audio frame jitter of a thread sending a frame every 20ms, like
+      discord.py's AudioPlayer does
+
+    A local HTTP server serves large web pages linking to an audio file,
+    the generic extractor scans each of them for embedded medias.
+
+    Usage: PYTHONPATH=. python3 benchmarks/bench_extraction.py [concurrent extractions] [processes]
+"""
+
+page_source = """<html>
+<head>
+<title>Page {index}</title>
+<meta property="og:title" content="Page {index}">
+<meta property="og:audio" content="/sound.mp3">
+</head>
+<body>
+{body}
+</body>
+</html>
+"""
+
+def write_pages(path: str, count: int, size: int = 1000) -> None:
+    with open(os.path.join(path, "sound.mp3"), "wb") as h:
+        h.write(b"ID3" + bytes(4096))
+
+    for i in range(count):
+        body = "\n".join(
+            "<div class=\"post\"><a href=\"/post/{0}\">Post {0}</a><p>Some text about post {0}.</p></div>".format(j)
+            for j in range(size)
+        )
+
+        with open(os.path.join(path, "page{}.html".format(i)), "w") as h:
+            h.write(page_source.format(index=i, body=body))
+
+class AudioThread(threading.Thread):
+    def __init__(self, frame_length: float = 0.02) -> None:
+        """Thread sending a frame every frame_length seconds and recording
+        how late each frame was"""
+
+        super().__init__(daemon=True)
+        self.frame_length = frame_length
+        self.delays = list()
+        self.running = True
+
+    def run(self) -> None:
+        frame = bytes(3840)
+        start = time.perf_counter()
+        loops = 0
+
+        while self.running:
+            loops += 1
+            # Stand-in for reading and encoding the frame
+            bytearray(frame)
+
+            next_frame = start + self.frame_length * loops
+            now = time.perf_counter()
+            if next_frame > now:
+                time.sleep(next_frame - now)
+
+            self.delays.append(max(0.0, time.perf_counter() - next_frame))
+
+async def measure_lag(lags: list, interval: float = 0.01) -> None:
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+def percentiles(values: list) -> str:
+    values = sorted(values)
+
+    return "median {:.1f}ms, p99 {:.1f}ms, max {:.1f}ms".format(
+        statistics.median(values) * 1000,
+        values[int(len(values) * 0.99)] * 1000,
+        values[-1] * 1000
+    )
+
+async def run(player: MarcelMediaPlayer, urls: list) -> float:
+    start = time.perf_counter()
+    results = await asyncio.gather(*(player.ytdl_fetch(url, as_playerinfo=True) for url in urls))
+
+    for pinfo in results:
+        if not pinfo.found:
+            raise Exception("Extraction failed: {}".format(pinfo.error))
+
+    return time.perf_counter() - start
+
+def main(concurrent: int = 20, processes: int = 4) -> None:
+    logging.disable(logging.CRITICAL)
+    loop = asyncio.get_event_loop()
+
+    # Run all the extractions at once (concurrent_extractions)
+    MarcelMediaPlayer.ytdl_scheduler.max_running = concurrent
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        write_pages(tmpdir, concurrent)
+        server = serve(tmpdir)
+        urls = [
+            "http://127.0.0.1:{}/page{}.html".format(server.server_port, i)
+            for i in range(concurrent)
+        ]
+
+        modes = (
+            ("threads", None),
+            ("processes", ExtractionPool(processes=processes))
+        )
+
+        for label, extraction_pool in modes:
+            player = MarcelMediaPlayer(
+                None,
+                ytdl_cache_dir=False,
+                extraction_pool=extraction_pool
+            )
+
+            # Import youtube_dl (and start the extraction processes)
+            loop.run_until_complete(run(player, urls[:processes]))
+
+            lags = list()
+            lag_task = loop.create_task(measure_lag(lags))
+            audio = AudioThread()
+            audio.start()
+
+            elapsed = loop.run_until_complete(run(player, urls))
+
+            audio.running = False
+            audio.join()
+            lag_task.cancel()
+
+            print("{:>9}: {} extractions in {:.0f}ms".format(label, concurrent, elapsed * 1000))
+            print("           loop lag:     {}".format(percentiles(lags)))
+            print("           frame delay:  {}".format(percentiles(audio.delays)))
+
+            if extraction_pool is not None:
+                extraction_pool.stop()
+
+if __name__ == "__main__":
+    main(*(int(x) for x in sys.argv[1:3]))
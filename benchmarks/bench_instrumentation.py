@@ -0,0 +1,123 @@
+from marcel import Marcel
+from _fixtures import make_bot
+import asyncio
+import time
+
+"""
+    Latency instrumentation overhead benchmark for Marcel the Discord Bot
+
+    Compares instrumented command and event handler dispatch (which records
+    every command and one event dispatch out of the sample interval in a
+    latency histogram) against awaiting the same functions without
+    instrumentation. The handlers do nothing, so the difference is the fixed
+    cost added to every command and event. Events are run with the default
+    sample interval and with every dispatch timed.
+
+    Usage: PYTHONPATH=. python3 benchmarks/bench_instrumentation.py [iterations]
+"""
+
+class Plugin:
+    plugin_name = "Benchmark"
+    bot_commands = [("noop", "noop_cmd")]
+
+    def __init__(self, marcel: Marcel):
+        self.marcel = marcel
+
+    async def noop_cmd(self, message, args, **kwargs):
+        pass
+
+    async def on_typing(self, channel, user, when):
+        pass
+
+def create_marcel(loop: asyncio.AbstractEventLoop, sample_interval: int) -> Marcel:
+    marcel = make_bot(loop, event_sample_interval=sample_interval)
+
+    plugin = Plugin(marcel)
+    marcel.plugins[plugin.plugin_name] = {"module": plugin, "filepath": None}
+    marcel.commands["noop"] = {
+        "plugin_name": plugin.plugin_name,
+        "function_name": "noop_cmd",
+        "attributes": tuple()
+    }
+    marcel.rebuild_command_table()
+    marcel.register_event_handler(plugin, "on_typing", "on_typing")
+
+    return marcel
+
+async def bench_commands(marcel: Marcel, count: int) -> tuple:
+    entry = marcel.command_table["noop"]
+    args = list()
+
+    start = time.perf_counter()
+    for _ in range(count):
+        await entry.func(None, args, settings=None, mediaplayer=None)
+    plain = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(count):
+        # Same instrumentation as Marcel.on_message
+        started = time.perf_counter()
+        try:
+            await entry.func(None, args, settings=None, mediaplayer=None)
+
+        except:
+            entry.latency.errors += 1
+            raise
+
+        finally:
+            entry.latency.record(time.perf_counter() - started)
+    instrumented = time.perf_counter() - start
+
+    return plain / count, instrumented / count
+
+async def uninstrumented_dispatch_event(marcel: Marcel, event_name: str, *args) -> None:
+    # Same as Marcel.dispatch_event, without the latency histograms
+    handlers = marcel.event_funcs.get(event_name) or marcel.build_event_handlers(event_name)
+
+    for func in handlers.funcs:
+        await func(*args)
+
+async def uninstrumented_on_typing(marcel: Marcel, channel, user, when) -> None:
+    await uninstrumented_dispatch_event(marcel, "on_typing", channel, user, when)
+
+async def bench_events(marcel: Marcel, count: int) -> tuple:
+    start = time.perf_counter()
+    for _ in range(count):
+        await uninstrumented_on_typing(marcel, None, None, None)
+    plain = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(count):
+        await marcel.on_typing(None, None, None)
+    instrumented = time.perf_counter() - start
+
+    return plain / count, instrumented / count
+
+def main(count: int = 200000):
+    loop = asyncio.new_event_loop()
+
+    for sample_interval in (make_bot().event_sample_interval, 1):
+        marcel = create_marcel(loop, sample_interval)
+        print("event sample interval {}:".format(sample_interval))
+
+        for label, bench in (("command", bench_commands), ("event", bench_events)):
+            plain, instrumented = min(
+                (loop.run_until_complete(bench(marcel, count)) for _ in range(3)),
+                key=lambda x: x[1]
+            )
+            print("{:>8}: {:.0f} ns uninstrumented, {:.0f} ns instrumented (+{:.0f} ns per dispatch)".format(
+                label,
+                plain * 1e9,
+                instrumented * 1e9,
+                (instrumented - plain) * 1e9
+            ))
+
+        for stat in marcel.get_latency_stats():
+            print("{kind:>8}: {name}: {count} calls, p50 {p50:.6f}s, p99 {p99:.6f}s".format(**stat))
+
+    loop.close()
+
+if __name__ == "__main__":
+    import sys
+
+    main(*[int(x) for x in sys.argv[1:2]])
@@ -0,0 +1,133 @@
+from pathlib import Path
+import subprocess
+import tempfile
+import json
+import sys
+import time
+
+"""
+    Plugin cold start benchmark for Marcel the Discord Bot
+
+    Loads a folder of plugins in a fresh interpreter, eagerly (executing and
+    instantiating every plugin) and lazily (scanning them and loading a
+    plugin when one of its commands is first called), and reports the time
+    and memory spent loading them and the cost of the first command call.
+
+    Without a plugins folder, synthetic plugins importing standard library
+    modules are generated.
+
+    Usage: PYTHONPATH=. python3 benchmarks/bench_plugins.py [plugins folder]
+"""
+
+plugin_source = """import {module}
+
+class MarcelPlugin:
+    plugin_name = "Plugin {index}"
+    plugin_description = "Synthetic plugin {index}"
+    plugin_help = ""
+    bot_commands = [{commands}]
+
+    def __init__(self, marcel):
+        self.marcel = marcel
+
+{functions}
+"""
+
+heavy_modules = (
+    "asyncio.subprocess", "csv", "decimal", "difflib", "email.mime.multipart",
+    "fractions", "ftplib", "http.server", "imaplib", "mailbox", "pydoc",
+    "smtplib", "sqlite3", "statistics", "tarfile", "unittest", "xml.dom.minidom",
+    "xml.etree.ElementTree", "xmlrpc.client", "zipfile"
+)
+
+def write_plugins(path: Path, command_count: int = 8) -> None:
+    for i, module in enumerate(heavy_modules):
+        commands = list()
+        functions = list()
+
+        for j in range(command_count):
+            commands.append("(\"cmd-{0}-{1}\", \"cmd_{0}_{1}\")".format(i, j))
+            functions.append("    async def cmd_{}_{}(self, message, args, **kwargs):\n        pass\n".format(i, j))
+
+        path.joinpath("plugin_{}.py".format(i)).write_text(plugin_source.format(
+            module=module,
+            index=i,
+            commands=", ".join(commands),
+            functions="\n".join(functions)
+        ))
+
+def run_child(plugins_path: str, lazy: bool) -> None:
+    from _fixtures import make_bot
+    from marcel.util import get_rss
+    import asyncio
+    import logging
+
+    logging.disable(logging.CRITICAL)
+
+    marcel = make_bot(
+        asyncio.new_event_loop(),
+        plugins_path=Path(plugins_path),
+        lazy_plugins=lazy
+    )
+
+    modules = len(sys.modules)
+    rss = get_rss()
+    start = time.perf_counter()
+    marcel.load_plugins()
+    load_time = time.perf_counter() - start
+    load_rss = get_rss() - rss
+    load_modules = len(sys.modules) - modules
+
+    # First call of the first command, it loads its plugin in lazy mode
+    entry = marcel.command_table[sorted(marcel.command_table)[0]]
+    start = time.perf_counter()
+    try:
+        marcel.loop.run_until_complete(entry.func(None, []))
+    except Exception:
+        pass
+    first_call = time.perf_counter() - start
+
+    print(json.dumps({
+        "plugins": len(marcel.plugins),
+        "load_time": load_time,
+        "load_rss": load_rss,
+        "modules": load_modules,
+        "first_call": first_call
+    }))
+
+def run(plugins_path: str, lazy: bool, repeat: int = 5) -> dict:
+    results = list()
+
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, __file__, "--child", plugins_path, "lazy" if lazy else "eager"],
+            check=True,
+            stdout=subprocess.PIPE,
+            universal_newlines=True
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    return min(results, key=lambda x: x["load_time"])
+
+def main(plugins_path: str = None) -> None:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        if plugins_path is None:
+            write_plugins(Path(tmpdir))
+            plugins_path = tmpdir
+
+        for label, lazy in (("eager", False), ("lazy", True)):
+            result = run(plugins_path, lazy)
+            print("{:>6}: {} plugins loaded in {:.1f}ms, {:.1f} MiB, {} modules imported, first command {:.1f}ms".format(
+                label,
+                result["plugins"],
+                result["load_time"] * 1000,
+                result["load_rss"] / 1048576,
+                result["modules"],
+                result["first_call"] * 1000
+            ))
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--child":
+        run_child(sys.argv[2], sys.argv[3] == "lazy")
+    else:
+        main(*sys.argv[1:2])
@@ -0,0 +1,97 @@
+from pathlib import Path
+from marcel.settings import JsonSettingsStore
+import random
+import tempfile
+import tracemalloc
+import json
+import gc
+
+"""
+    Server settings memory benchmark for Marcel the Discord Bot
+
+    Builds a synthetic servers.json in the previous format (every guild
+    holds a full copy of the default settings, some override a few of
+    them) and compares the memory and file size of the full copies against
+    the sparse overlay of JsonSettingsStore.
+
+    Usage: PYTHONPATH=. python3 benchmarks/bench_settings.py [guilds]
+"""
+
+defaults = {
+    "prefix": "!!",
+    "clean_commands": False,
+    "delete_after": 10.0,
+    "volume": 1.0,
+    "volume_limit": 1.25
+}
+
+def synthetic_settings(guild_count: int) -> dict:
+    random.seed(0)
+    settings = dict()
+
+    for i in range(guild_count):
+        guild_settings = defaults.copy()
+
+        if random.random() < 0.10:
+            guild_settings["prefix"] = random.choice(("?", "$", "m!", ";;"))
+        if random.random() < 0.05:
+            guild_settings["volume"] = round(random.uniform(0.1, 1.25), 2)
+        if random.random() < 0.02:
+            guild_settings["tts_lang"] = random.choice(("fr", "de", "es"))
+
+        settings[str(700000000000000000 + i)] = guild_settings
+
+    return settings
+
+def measure(func) -> tuple:
+    """Return the result of func and the memory it allocated (in bytes)"""
+
+    gc.collect()
+    tracemalloc.start()
+    result = func()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    return result, size
+
+def main(guild_count: int = 50000):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        servers_file = Path(tmpdir).joinpath("servers.json")
+
+        with servers_file.open("w") as h:
+            json.dump(synthetic_settings(guild_count), h, indent=4)
+        legacy_file_size = servers_file.stat().st_size
+
+        def load_legacy():
+            with servers_file.open("r") as h:
+                return json.load(h)
+
+        def load_sparse():
+            store = JsonSettingsStore(servers_file, defaults)
+            store.load()
+            return store
+
+        legacy, legacy_memory = measure(load_legacy)
+        store, sparse_memory = measure(load_sparse)
+        del legacy
+
+        store.save()
+        sparse_file_size = servers_file.stat().st_size
+        overriding = sum(1 for x in store.settings.values() if x.overrides)
+
+    print("{} guilds, {} overriding the defaults".format(guild_count, overriding))
+    print("{:>8}: {:>8.1f} MiB in memory, {:>8.1f} KiB servers.json".format(
+        "copies",
+        legacy_memory / 1048576,
+        legacy_file_size / 1024
+    ))
+    print("{:>8}: {:>8.1f} MiB in memory, {:>8.1f} KiB servers.json".format(
+        "overlay",
+        sparse_memory / 1048576,
+        sparse_file_size / 1024
+    ))
+
+if __name__ == "__main__":
+    import sys
+
+    main(*[int(x) for x in sys.argv[1:2]])
@@ -0,0 +1,99 @@
+import subprocess
+import json
+import sys
+import timeit
+
+"""
+    youtube-dl import and URL matching benchmark for Marcel the Discord Bot
+
+    Measures, in fresh interpreters, the time and memory spent importing
+    marcel.voice (youtube_dl is now imported on the first media request)
+    and youtube_dl itself, then compares the cost of finding the extractor
+    of a request with all the extractors and with an allow-list.
+
+    Usage: PYTHONPATH=. python3 benchmarks/bench_ytdl.py
+"""
+
+allow_list = ("Youtube", "YoutubeTab", "YoutubePlaylist", "YoutubeSearch", "Soundcloud", "SoundcloudSet", "Generic")
+
+requests = (
+    "https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+    "https://youtu.be/dQw4w9WgXcQ",
+    "https://www.youtube.com/playlist?list=PLFgquLnL59alCl_2TQvOiD5Vgm1hCaGSI",
+    "https://soundcloud.com/artist/track",
+    "https://soundcloud.com/artist/sets/album",
+    "https://example.com/media/sound.mp3",
+    "ytsearch:never gonna give you up"
+)
+
+import_code = """
+import json, os, sys, time
+def get_rss():
+    with open("/proc/self/statm") as h:
+        return int(h.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+rss = get_rss()
+modules = len(sys.modules)
+start = time.perf_counter()
+import {module}
+print(json.dumps({{"time": time.perf_counter() - start, "rss": get_rss() - rss, "modules": len(sys.modules) - modules}}))
+"""
+
+def measure_import(module: str, repeat: int = 5) -> dict:
+    results = list()
+
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", import_code.format(module=module)],
+            check=True,
+            stdout=subprocess.PIPE,
+            universal_newlines=True
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    return min(results, key=lambda x: x["time"])
+
+def match(extractors: tuple, url: str):
+    for extractor in extractors:
+        if extractor.suitable(url):
+            return extractor
+
+    return None
+
+def main() -> None:
+    for module in ("marcel.voice", "youtube_dl"):
+        result = measure_import(module)
+        print("import {:>12}: {:.1f}ms, {:.1f} MiB, {} modules imported".format(
+            module,
+            result["time"] * 1000,
+            result["rss"] / 1048576,
+            result["modules"]
+        ))
+
+    from marcel.voice import get_extractor_classes
+
+    extractor_sets = (
+        ("all", get_extractor_classes()),
+        ("allow-list", get_extractor_classes(allow_list))
+    )
+
+    for label, extractors in extractor_sets:
+        # suitable() compiles the URL regexps on its first call
+        for url in requests:
+            match(extractors, url)
+
+        number = 200
+        match_time = min(timeit.repeat(
+            lambda: [match(extractors, url) for url in requests],
+            number=number,
+            repeat=5
+        )) / (number * len(requests))
+
+        print("{:>10}: {} extractors, {:.1f}us/request matched ({})".format(
+            label,
+            len(extractors),
+            match_time * 1e6,
+            ", ".join(match(extractors, url).ie_key() for url in requests)
+        ))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+from http.server import HTTPServer, SimpleHTTPRequestHandler
+from functools import partial
+from marcel.voice import MarcelMediaPlayer, ytdl_pool
+import asyncio
+import tempfile
+import threading
+import statistics
+import logging
+import time
+import sys
+import os
+
+"""
+    youtube-dl extraction latency benchmark for Marcel the Discord Bot
+
+    Measures the latency of MarcelMediaPlayer.ytdl_fetch with a cold
+    YoutubeDL pool (emptied before each request, like the previous one
+    instance per request behavior) and a warm pool (instances reused).
+
+    Without URLs, a local HTTP server serves a direct audio link handled by
+    the generic extractor, which isolates the per-request overhead from the
+    network. Pass URLs to measure real extractions (e.g. YouTube videos,
+    where the warm pool keeps the cached player signatures).
+
+    Usage: PYTHONPATH=. python3 benchmarks/bench_ytdl_pool.py [url ...]
+"""
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args) -> None:
+        pass
+
+def serve(path: str) -> HTTPServer:
+    server = HTTPServer(("127.0.0.1", 0), partial(QuietHandler, directory=path))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server
+
+async def measure(player: MarcelMediaPlayer, urls: list, requests: int, cold: bool) -> list:
+    latencies = list()
+
+    for i in range(requests):
+        if cold:
+            ytdl_pool.clear()
+
+        start = time.perf_counter()
+        pinfo = await player.ytdl_fetch(urls[i % len(urls)], as_playerinfo=True)
+        latencies.append(time.perf_counter() - start)
+
+        if not pinfo.found:
+            raise Exception("Extraction failed: {}".format(pinfo.error))
+
+    return latencies
+
+def main(urls: list, requests: int = 50) -> None:
+    logging.disable(logging.CRITICAL)
+    loop = asyncio.get_event_loop()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        if not urls:
+            with open(os.path.join(tmpdir, "sound.mp3"), "wb") as h:
+                h.write(b"ID3" + bytes(4096))
+
+            server = serve(tmpdir)
+            urls = ["http://127.0.0.1:{}/sound.mp3".format(server.server_port)]
+
+        player = MarcelMediaPlayer(None, ytdl_cache_dir=os.path.join(tmpdir, "cache"))
+
+        # Import youtube_dl and its extractors
+        loop.run_until_complete(measure(player, urls, 1, cold=True))
+
+        for label, cold in (("cold", True), ("warm", False)):
+            created = ytdl_pool.created
+            latencies = loop.run_until_complete(measure(player, urls, requests, cold))
+            latencies.sort()
+
+            print("{}: {} requests, median {:.1f}ms, p90 {:.1f}ms, {} instances created".format(
+                label,
+                requests,
+                statistics.median(latencies) * 1000,
+                latencies[int(len(latencies) * 0.9)] * 1000,
+                ytdl_pool.created - created
+            ))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,4 +1,4 @@
-from marcel.bot import Marcel
+from marcel.bot import Marcel, ShardedMarcel
 from marcel.voice import MarcelMediaPlayer, PlayerInfo
 
 """
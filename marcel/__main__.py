@@ -1,6 +1,6 @@
 from typing import Union
 from pathlib import Path
-from marcel import Marcel
+from marcel import Marcel, ShardedMarcel
 import json
 import sys
 
@@ -70,6 +70,18 @@ def initialize_cfg(path: Union[str, Path]) -> int:
     print("Configuration initialized in: {}".format(path))
     return 0
 
+def create_marcel(cfg_path: Union[str, Path], plugins_path: Union[str, Path]) -> Marcel:
+    """Return a Marcel, or a ShardedMarcel if sharding is enabled in config.json"""
+
+    cfg_file = Path(cfg_path).expanduser().resolve().joinpath("config.json")
+    with cfg_file.open("r") as h:
+        cfg = json.load(h)
+
+    if cfg.get("sharding", dict()).get("enabled", False):
+        return ShardedMarcel(cfg_path, plugins_path)
+
+    return Marcel(cfg_path, plugins_path)
+
 def main():
     from argparse import ArgumentParser
 
@@ -95,12 +107,24 @@ def main():
         default=None,
         help="Initialize configuration folder in the given path"
     )
+    arg_parser.add_argument(
+        "--cluster",
+        dest="cluster",
+        type=int,
+        default=0,
+        help="Run the bot in N processes, each one running a part of the shards"
+    )
     args = arg_parser.parse_args()
 
     if args.initialize:
         return initialize_cfg(args.initialize)
 
-    marcel_the_bot = Marcel(
+    if args.cluster > 0:
+        from marcel.cluster import run_cluster
+
+        return run_cluster(args.cfg_path, args.plugins_path, args.cluster)
+
+    marcel_the_bot = create_marcel(
         args.cfg_path,
         args.plugins_path
     )
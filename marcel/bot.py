@@ -1,9 +1,17 @@
-from marcel.voice import MarcelMediaPlayer, PlayerInfo
-from marcel.util import embed_message
+from marcel.voice import MarcelMediaPlayer, PlayerInfo, MediaCache, ExtractionPool
+from marcel.util import embed_message, get_rss
+from marcel.stats import LatencyStats, LatencyHistogram, LatencySampler
+from marcel.metrics import MetricsExporter
+from marcel.monitor import LoopLagMonitor, LoopWatchdog
+from marcel.settings import GuildSettings, JsonSettingsStore, SqliteSettingsStore
+from marcel.mediastore import MediaStore
+from marcel.loader import LazyPlugin, scan_plugin
+from marcel.watcher import PluginWatcher
 from pathlib import Path
-from typing import Union
+from typing import Union, Callable, NamedTuple, Awaitable
 from importlib import machinery
 import os
+import asyncio
 import json
 import logging
 import discord
@@ -29,8 +37,66 @@ import datetime
     along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
+class CommandEntry(NamedTuple):
+    """Precompiled command dispatch record"""
+    func: Callable
+    plugin_name: str
+    function_name: str
+    clean_command: bool
+    attributes: tuple
+    latency: LatencyHistogram
+    warming: bool       # The plugin's on_load() is still running
+
+class EventHandler(NamedTuple):
+    """Bound event handler record"""
+    func: Callable
+    plugin_name: str
+    ordered: bool
+    latency: LatencyHistogram
+
+class EventHandlers(NamedTuple):
+    """Bound handlers of an event"""
+    funcs: tuple        # All handler functions, in registration order
+    handlers: tuple     # All EventHandler records, in registration order
+    concurrent: tuple   # Handlers that can run as independent tasks
+    ordered: tuple      # Handlers of plugins that require ordered dispatch
+    sampler: LatencySampler
+
+# Gateway intents that are always requested: guilds and their channels,
+# guild messages for the commands and voice states for the media players
+core_intents = ("guilds", "guild_messages", "voice_states")
+
+# Gateway intents needed to receive each event
+event_intents = {
+    "on_typing": ("guild_typing", "dm_typing"),
+    "on_message": ("guild_messages", "dm_messages"),
+    "on_message_delete": ("guild_messages", "dm_messages"),
+    "on_bulk_message_delete": ("guild_messages", ),
+    "on_message_edit": ("guild_messages", "dm_messages"),
+    "on_reaction_add": ("guild_reactions", "dm_reactions"),
+    "on_reaction_remove": ("guild_reactions", "dm_reactions"),
+    "on_reaction_clear": ("guild_reactions", "dm_reactions"),
+    "on_reaction_clear_emoji": ("guild_reactions", "dm_reactions"),
+    "on_member_join": ("members", ),
+    "on_member_remove": ("members", ),
+    "on_member_update": ("members", ),
+    "on_guild_join": ("guilds", ),
+    "on_guild_remove": ("guilds", ),
+    "on_guild_update": ("guilds", ),
+    "on_guild_available": ("guilds", ),
+    "on_guild_unavailable": ("guilds", ),
+    "on_voice_state_update": ("voice_states", ),
+    "on_member_ban": ("bans", ),
+    "on_member_unban": ("bans", ),
+    "on_invite_create": ("invites", ),
+    "on_invite_delete": ("invites", )
+}
+
 class Marcel(discord.Client):
     def __init__(self, cfg_path: Union[str, Path], plugins_path: Union[str, Path]) -> None:
+        self.init_time = time.perf_counter()
+        self.startup_reported = False
+
         # Expand cfg_path (bot root folder)
         if isinstance(cfg_path, Path):
             self.cfg_path = cfg_path
@@ -47,9 +113,19 @@ class Marcel(discord.Client):
         # Initializing variables
         self.plugins = dict()         # Loaded bot plugins
         self.commands = dict()        # Commands' function handlers
+        self.command_table = dict()   # Commands' bound functions (dispatch table)
         self.media_players = dict()   # Voice clients for each server
         self.event_handlers = dict()  # Bot events' function handlers
+        self.event_funcs = dict()     # Bot events' bound functions (cached)
+        self.latency_stats = LatencyStats()  # Commands' and events' latency histograms
         self.owners = list()          # Bot owners
+        self.gateway_intents = None   # Gateway intents of the connection (once started)
+        self.cluster = None           # Cluster IPC channel (when running as a cluster worker)
+        self.cluster_actions = {      # Actions that can be broadcast to all the cluster workers
+            "reload-all": self.reload_plugins,
+            "save-settings": self.save_server_settings,
+            "server-list": self.get_server_list
+        }
 
         # Setup logging
         log_level_cfg = self.cfg.get("logging", dict()).get("level", "warning")
@@ -83,11 +159,118 @@ class Marcel(discord.Client):
             logger.addHandler(log_file)
             logger.debug("Logging to {}".format(log_file_path))
 
-        # Load configuration settings
+        # Plugins
+        self.plugin_load_timeout = self.cfg.get("plugins", dict()).get("load_timeout", 30.0)
+        self.lazy_plugins = self.cfg.get("plugins", dict()).get("lazy", False)
+
+        # Event handlers registered by plugins while they are hot reloaded
+        # (plugin name -> list of (plugin_name, event_name, function_name))
+        self.staged_event_handlers = dict()
+
+        # Media information cache shared by the media players
+        media_cache_cfg = self.cfg.get("voice_client", dict()).get("media_cache", dict())
+        if media_cache_cfg.get("enabled", True) and media_cache_cfg.get("persistent", True):
+            self.media_store = MediaStore(
+                Path(media_cache_cfg.get("file", str(self.cfg_path.joinpath("media.db")))).expanduser(),
+                max_entries=media_cache_cfg.get("store_size", 50000),
+                max_age=media_cache_cfg.get("max_age", 604800.0)
+            )
+        else:
+            self.media_store = None
+
+        if media_cache_cfg.get("enabled", True):
+            self.media_cache = MediaCache(
+                max_entries=media_cache_cfg.get("size", 1000),
+                metadata_ttl=media_cache_cfg.get("metadata_ttl", 21600.0),
+                playback_ttl=media_cache_cfg.get("playback_ttl", 1800.0),
+                store=self.media_store
+            )
+        else:
+            self.media_cache = None
+
+        # youtube-dl extractions run in the loop's thread pool unless
+        # extraction processes are set
+        voice_cfg = self.cfg.get("voice_client", dict())
+        if voice_cfg.get("extraction_processes", 0) > 0:
+            self.extraction_pool = ExtractionPool(
+                processes=voice_cfg.get("extraction_processes"),
+                max_jobs=voice_cfg.get("extraction_max_jobs", 100)
+            )
+        else:
+            self.extraction_pool = None
+
+        # Extractions over this limit wait in the scheduler by priority
+        MarcelMediaPlayer.ytdl_scheduler.max_running = voice_cfg.get(
+            "concurrent_extractions",
+            voice_cfg.get("extraction_processes") or 4
+        )
+
+        # Event handlers dispatch mode
+        events_cfg = self.cfg.get("events", dict())
+        self.concurrent_events = events_cfg.get("concurrent", False)
+        self.event_handler_timeout = events_cfg.get("handler_timeout", 30.0)
+        if not self.event_handler_timeout or self.event_handler_timeout <= 0:
+            self.event_handler_timeout = None
+
+        # One dispatch of each event out of event_sample_interval is timed
+        self.event_sample_interval = max(1, events_cfg.get("latency_sample_interval", 16))
+
+        # Event tasks nothing else waits for, the loop only keeps weak
+        # references to its tasks
+        self.event_tasks = set()
+
+        # Load server settings
+        settings_cfg = self.cfg.get("server_settings", dict())
+        settings_backend = settings_cfg.get("backend", "json")
+
+        if settings_backend == "json":
+            self.settings_store = JsonSettingsStore(
+                self.servers_file,
+                self.server_defaults,
+                flush_interval=settings_cfg.get("flush_interval", 5.0),
+                compact_after=settings_cfg.get("compact_after", 1000)
+            )
+        elif settings_backend == "sqlite":
+            self.settings_store = SqliteSettingsStore(
+                Path(settings_cfg.get("file", str(self.cfg_path.joinpath("servers.db")))).expanduser(),
+                self.server_defaults,
+                flush_interval=settings_cfg.get("flush_interval", 5.0),
+                cache_size=settings_cfg.get("cache_size", 1000),
+                migrate_from=self.servers_file
+            )
+        else:
+            raise Exception("Accepted server settings backends are json, sqlite")
         self.load_server_settings()
 
         # Initialize discord.Client
-        super(Marcel, self).__init__(intents=discord.Intents.all())
+        super(Marcel, self).__init__(**self.get_client_options())
+
+        # Event loop monitoring
+        watchdog_cfg = self.cfg.get("watchdog", dict())
+        metrics_cfg = self.cfg.get("metrics", dict())
+
+        if watchdog_cfg.get("enabled", False):
+            self.loop_monitor = LoopWatchdog(
+                self.loop,
+                threshold=watchdog_cfg.get("threshold", 0.25),
+                history=watchdog_cfg.get("history", 20),
+                attribute=self.attribute_stall
+            )
+        elif metrics_cfg.get("enabled", False):
+            self.loop_monitor = LoopLagMonitor(self.loop)
+        else:
+            self.loop_monitor = None
+
+        # Metrics exporter
+        if metrics_cfg.get("enabled", False):
+            self.metrics_exporter = MetricsExporter(
+                self,
+                self.loop_monitor,
+                host=metrics_cfg.get("host", "127.0.0.1"),
+                port=metrics_cfg.get("port", 9150)
+            )
+        else:
+            self.metrics_exporter = None
 
         # Expand plugins_path (bot plugins folder)
         if isinstance(plugins_path, Path):
@@ -95,6 +278,16 @@ class Marcel(discord.Client):
         else:
             self.plugins_path = Path(plugins_path).expanduser().resolve()
 
+        # Watch the plugins folder
+        if self.cfg.get("plugins", dict()).get("watch", False):
+            self.plugin_watcher = PluginWatcher(
+                self,
+                self.plugins_path,
+                interval=self.cfg.get("plugins", dict()).get("watch_interval", 1.0)
+            )
+        else:
+            self.plugin_watcher = None
+
         # Load plugins
         self.load_plugins()
 
@@ -106,13 +299,225 @@ class Marcel(discord.Client):
         )
         self.save_server_settings()
 
+    async def start(self, *args, **kwargs) -> None:
+        """Start background services and connect to Discord"""
+
+        self.apply_intents(self.get_intents())
+
+        if self.loop_monitor:
+            self.loop_monitor.start()
+
+        self.settings_store.start(self.loop)
+
+        if self.media_store:
+            self.media_store.start(self.loop)
+
+        if self.plugin_watcher:
+            self.plugin_watcher.start(self.loop)
+
+        if self.cluster:
+            self.cluster.start(self.loop)
+
+        await super(Marcel, self).start(*args, **kwargs)
+
+    async def close(self) -> None:
+        """Close the connection to Discord and stop background services"""
+
+        if self.metrics_exporter:
+            await self.metrics_exporter.stop()
+
+        if self.loop_monitor:
+            self.loop_monitor.stop()
+
+        if self.plugin_watcher:
+            self.plugin_watcher.stop()
+
+        if self.cluster:
+            self.cluster.stop()
+
+        try:
+            await self.settings_store.stop()
+
+        except Exception as e:
+            logging.error("Unable to flush server settings: {}".format(e))
+
+        if self.media_store:
+            try:
+                await self.media_store.stop()
+
+            except Exception as e:
+                logging.error("Unable to flush media store: {}".format(e))
+
+        if self.extraction_pool:
+            self.extraction_pool.stop()
+
+        await super(Marcel, self).close()
+
+    def attribute_stall(self, frame: types.FrameType) -> dict:
+        """Return the plugin and the command or event running in frame (and its callers)
+        This is called from the watchdog thread while the loop is stalled"""
+
+        plugin_files = {
+            str(plugin.get("filepath")): name for name, plugin in list(self.plugins.items())
+        }
+        attribution = {"plugin_name": None, "kind": None, "name": None}
+        function_name = None
+
+        while frame is not None:
+            code = frame.f_code
+
+            if attribution["plugin_name"] is None:
+                attribution["plugin_name"] = plugin_files.get(code.co_filename)
+
+            if code.co_filename == __file__ and attribution["kind"] is None:
+                if code.co_name == "on_message" and frame.f_locals.get("entry"):
+                    attribution["kind"] = "command"
+                    attribution["name"] = frame.f_locals.get("command")
+                    if attribution["plugin_name"] is None:
+                        attribution["plugin_name"] = frame.f_locals["entry"].plugin_name
+
+                elif "event_name" in code.co_varnames:
+                    attribution["kind"] = "event"
+                    attribution["name"] = frame.f_locals.get("event_name")
+
+                elif function_name is None:
+                    function_name = code.co_name
+
+            frame = frame.f_back
+
+        if attribution["kind"] is None and function_name is not None:
+            attribution["kind"] = "function"
+            attribution["name"] = function_name
+
+        return attribution
+
+    def get_stalls(self) -> list:
+        """Return the recent event loop stalls detected by the watchdog (most recent last)
+        Stalls are dict() with the following keys:
+        time: when the stall started (UNIX timestamp)
+        duration: how long the loop was stalled (in seconds)
+        plugin_name, kind ("command", "event" or "function"), name: what was running
+        stack: formatted stack of the loop when the stall was detected"""
+
+        if isinstance(self.loop_monitor, LoopWatchdog):
+            return self.loop_monitor.get_stalls()
+
+        return list()
+
+    def get_client_options(self) -> dict:
+        """Return the keyword arguments of the discord.Client constructor
+        The intents are replaced by the ones the plugins need before connecting"""
+
+        max_messages = self.cfg.get("cache", dict()).get("max_messages", 1000)
+
+        return {
+            "intents": discord.Intents.all(),
+            "max_messages": max_messages if max_messages else None
+        }
+
+    def get_intents_requirements(self, plugin_name: str = None) -> dict:
+        """Return the gateway intents needed by the loaded plugins (or by plugin_name)
+        as a dict() of intent: list of plugin names
+        Plugins need the intents of the events they handle and the ones in
+        their plugin_intents attribute"""
+
+        requirements = dict()
+
+        for event_name, handlers in self.event_handlers.items():
+            for handler in handlers:
+                if plugin_name is None or handler["plugin_name"] == plugin_name:
+                    for intent in event_intents.get(event_name, tuple()):
+                        requirements.setdefault(intent, list()).append(handler["plugin_name"])
+
+        for name, plugin in self.plugins.items():
+            if plugin_name is None or name == plugin_name:
+                for intent in getattr(plugin.get("module"), "plugin_intents", tuple()):
+                    requirements.setdefault(intent, list()).append(name)
+
+        return requirements
+
+    def get_intents(self) -> discord.Intents:
+        """Return the gateway intents needed by the loaded plugins, with the
+        overrides of the intents configuration"""
+
+        intents = discord.Intents.none()
+
+        for intent in core_intents:
+            setattr(intents, intent, True)
+
+        for intent in self.get_intents_requirements():
+            if intent in discord.Intents.VALID_FLAGS:
+                setattr(intents, intent, True)
+
+        for intent, value in self.cfg.get("intents", dict()).items():
+            if intent in discord.Intents.VALID_FLAGS:
+                setattr(intents, intent, bool(value))
+            else:
+                logging.error("Unknown gateway intent in configuration: {}".format(intent))
+
+        return intents
+
+    def check_intents(self, intents: discord.Intents, plugin_name: str = None) -> None:
+        """Warn about the intents needed by the loaded plugins (or by
+        plugin_name) that are missing from intents"""
+
+        for intent, plugins in self.get_intents_requirements(plugin_name).items():
+            if intent not in discord.Intents.VALID_FLAGS:
+                logging.warning("Plugin {} needs an unknown gateway intent: {}".format(
+                    ", ".join(sorted(set(plugins))),
+                    intent
+                ))
+
+            elif not getattr(intents, intent):
+                logging.warning("Gateway intent {} is disabled but plugin {} needs it{}".format(
+                    intent,
+                    ", ".join(sorted(set(plugins))),
+                    ", restart the bot to enable it" if self.gateway_intents is not None else ""
+                ))
+
+    def apply_intents(self, intents: discord.Intents) -> None:
+        """Use intents for the next connection to Discord"""
+
+        self.check_intents(intents)
+
+        # discord.Client only takes its intents in its constructor but the
+        # plugins (and the events they handle) are loaded after it
+        cache_cfg = self.cfg.get("cache", dict())
+        member_cache_flags = discord.MemberCacheFlags.from_intents(intents)
+        required_intents = {"online": "presences", "joined": "members", "voice": "voice_states"}
+
+        for flag, value in cache_cfg.get("member_cache", dict()).items():
+            if flag not in required_intents:
+                logging.error("Unknown member cache flag in configuration: {}".format(flag))
+            elif value and not getattr(intents, required_intents[flag]):
+                logging.warning("Member cache flag {} requires the {} intent".format(
+                    flag,
+                    required_intents[flag]
+                ))
+            else:
+                setattr(member_cache_flags, flag, bool(value))
+
+        chunk_guilds = cache_cfg.get("chunk_guilds_at_startup", intents.members)
+        if chunk_guilds and not intents.members:
+            logging.warning("Chunking guilds at startup requires the members intent")
+            chunk_guilds = False
+
+        self._connection._intents = intents
+        self._connection._member_cache_flags = member_cache_flags
+        self._connection._chunk_guilds = chunk_guilds
+        self.gateway_intents = intents
+
+        logging.info("Gateway intents: {}".format(
+            ", ".join(name for name, value in intents if value)
+        ))
+
     def load_cfg(self) -> None:
         """Load bot configuration from config.json"""
 
         with self.cfg_file.open("r") as h:
             self.cfg = json.load(h)
 
-        self.server_settings_default = self.cfg.get("server_default", dict())
+        self.server_defaults = self.cfg.get("server_defaults", dict())
 
     async def load_owners(self) -> None:
         """Load bot owners from configuration and application owner"""
@@ -120,7 +525,18 @@ class Marcel(discord.Client):
         self.owners.clear()
 
         for owner in self.cfg.get("owners", list()):
-            self.owners.append(self.get_user(int(owner)))
+            # Users are only cached if they share a guild with the bot
+            # and the members intent is enabled
+            user = self.get_user(int(owner))
+            if user is None:
+                try:
+                    user = await self.fetch_user(int(owner))
+
+                except Exception as e:
+                    logging.error("Unable to get owner: {}: {}".format(owner, e))
+                    continue
+
+            self.owners.append(user)
 
         appinfo = await self.application_info()
 
@@ -132,53 +548,66 @@ class Marcel(discord.Client):
                 appinfo.owner.id
             ))
 
-    def load_plugin(self, filepath: Union[str, Path]) -> bool:
+    def load_plugin(self, filepath: Union[str, Path], lazy: bool = False) -> bool:
         """Load plugin
+        lazy: only scan the plugin and load it when one of its commands
+              is first called (plugins with event handlers are always loaded)
         Return True if plugin was loaded, False on failure"""
 
         if not isinstance(filepath, Path):
             filepath = Path(filepath).expanduser().resolve()
 
         try:
-            logging.info("Loading plugin: {}".format(filepath))
-            loader = machinery.SourceFileLoader("MarcelPlugin", str(filepath))
-            module = types.ModuleType(loader.name)
-            loader.exec_module(module)
+            info = scan_plugin(filepath) if lazy else None
 
-            plugin_name = module.MarcelPlugin.plugin_name
+            if info is not None and not info.has_event_handlers:
+                logging.info("Scanned plugin: {}".format(filepath))
+                plugin_name = info.plugin_name
+                bot_commands = info.bot_commands
 
-            if plugin_name in self.plugins:
-                raise Exception("Plugin: {}: is already loaded".format(plugin_name))
+                if plugin_name in self.plugins:
+                    raise Exception("Plugin: {}: is already loaded".format(plugin_name))
 
-            plugin_module = module.MarcelPlugin(self)
+                init_time = 0.0
+                plugin_module = LazyPlugin(info, self.load_lazy_plugin)
 
-            for command in module.MarcelPlugin.bot_commands:
-                command_name = command[0]
-                command_funcname = command[1] if len(command) > 1 else command_name
-                command_attributes = command[2:] if len(command) > 2 else tuple()
+            else:
+                logging.info("Loading plugin: {}".format(filepath))
+                plugin_class = self.import_plugin(filepath)
+                plugin_name = plugin_class.plugin_name
+                bot_commands = plugin_class.bot_commands
 
-                if command_name in self.commands:
-                    logging.error("Unable to add command: {}: from {}: command already exists".format(
-                        command_name,
-                        plugin_name
-                    ))
+                if plugin_name in self.plugins and not self.plugins[plugin_name].get("lazy"):
+                    raise Exception("Plugin: {}: is already loaded".format(plugin_name))
 
-                else:
-                    logging.info("Adding command: {}: from {}".format(
-                        command_name,
-                        plugin_name
-                    ))
+                start = time.perf_counter()
+                plugin_module = plugin_class(self)
+                init_time = time.perf_counter() - start
 
-                    self.commands[command_name] = {
-                        "plugin_name": plugin_name,
-                        "function_name": command_funcname,
-                        "attributes": command_attributes
-                    }
+                # Replace the plugin's lazy stand-in, there are no awaits
+                # until the command table is rebuilt
+                if plugin_name in self.plugins:
+                    self.remove_plugin_commands(plugin_name)
+                    del self.plugins[plugin_name]
 
-            self.plugins[plugin_name] = {
-                "module": plugin_module,
-                "filepath": filepath
-            }
+            on_load_func = getattr(plugin_module, "on_load", None)
+            self.add_plugin(plugin_name, plugin_module, filepath, bot_commands, on_load_func is None)
+
+            if not self.plugins[plugin_name]["lazy"]:
+                logging.info("Initialized plugin: {} in {:.1f}ms".format(plugin_name, init_time * 1000))
+
+            # on_load() functions run concurrently on the bot's loop, they
+            # start when it runs if it is not running yet
+            if on_load_func is not None:
+                self.plugins[plugin_name]["load_task"] = self.loop.create_task(
+                    self.run_plugin_on_load(plugin_name, on_load_func)
+                )
+
+            self.rebuild_command_table()
+            self.event_funcs.clear()
+
+            if self.gateway_intents is not None:
+                self.check_intents(self.gateway_intents, plugin_name)
 
             return True
 
@@ -190,6 +619,218 @@ class Marcel(discord.Client):
 
         return False
 
+    async def run_plugin_on_load(self, name: str, on_load_func: Callable) -> None:
+        """Run the on_load function of plugin name, the plugin is ready
+        once it completes and is unloaded if it fails or times out"""
+
+        logging.info("Executing on_load function for plugin: {}".format(name))
+        start = time.perf_counter()
+
+        try:
+            await asyncio.wait_for(on_load_func(), timeout=self.plugin_load_timeout)
+
+        except asyncio.CancelledError:
+            raise
+
+        except Exception as e:
+            logging.error("on_load() for plugin: {}: {}".format(
+                name,
+                "timed out after {}s".format(self.plugin_load_timeout) if isinstance(e, asyncio.TimeoutError) else e
+            ))
+
+            self.plugins[name]["load_task"] = None
+            self.unload_plugin(name)
+            return
+
+        self.plugins[name]["ready"] = True
+        self.plugins[name]["load_task"] = None
+        self.rebuild_command_table()
+        self.event_funcs.clear()
+
+        logging.info("Loaded plugin: {} in {:.1f}ms".format(
+            name,
+            (time.perf_counter() - start) * 1000
+        ))
+
+    def import_plugin(self, filepath: Path) -> type:
+        """Execute plugin filepath and return its MarcelPlugin class"""
+
+        loader = machinery.SourceFileLoader("MarcelPlugin", str(filepath))
+        module = types.ModuleType(loader.name)
+        loader.exec_module(module)
+
+        return module.MarcelPlugin
+
+    def add_plugin(
+        self,
+        plugin_name: str,
+        plugin_module: object,
+        filepath: Path,
+        bot_commands: list,
+        ready: bool) -> None:
+        """Add plugin_module and its commands to the loaded plugins
+        The command table is not rebuilt"""
+
+        for command in bot_commands:
+            command_name = command[0]
+            command_funcname = command[1] if len(command) > 1 else command_name
+            command_attributes = command[2:] if len(command) > 2 else tuple()
+
+            if command_name in self.commands:
+                logging.error("Unable to add command: {}: from {}: command already exists".format(
+                    command_name,
+                    plugin_name
+                ))
+
+            else:
+                logging.info("Adding command: {}: from {}".format(
+                    command_name,
+                    plugin_name
+                ))
+
+                self.commands[command_name] = {
+                    "plugin_name": plugin_name,
+                    "function_name": command_funcname,
+                    "attributes": command_attributes
+                }
+
+        self.plugins[plugin_name] = {
+            "module": plugin_module,
+            "filepath": filepath,
+            "ready": ready,
+            "load_task": None,
+            "lazy": isinstance(plugin_module, LazyPlugin)
+        }
+
+    async def hot_reload_plugin(self, filepath: Path) -> bool:
+        """Load, reload or unload plugin filepath after it changed
+        The new version is executed, instantiated and its on_load function
+        completes while the previous version is still loaded, then it
+        replaces it without awaiting in between
+        Return True on success, False on failure"""
+
+        old_name = None
+        for name, plugin in self.plugins.items():
+            if plugin.get("filepath") == filepath:
+                old_name = name
+                break
+
+        if not filepath.exists():
+            return self.unload_plugin(old_name) if old_name is not None else False
+
+        if self.lazy_plugins and (old_name is None or self.plugins[old_name].get("lazy")):
+            try:
+                info = scan_plugin(filepath)
+
+            except Exception:
+                info = None
+
+            # Lazy stand-ins are swapped synchronously
+            if info is not None and not info.has_event_handlers:
+                if old_name is not None:
+                    self.unload_plugin(old_name)
+
+                return self.load_plugin(filepath, lazy=True)
+
+        logging.info("Reloading plugin: {}".format(filepath))
+        start = time.perf_counter()
+        plugin_module = None
+        staged = False
+
+        try:
+            plugin_class = await self.loop.run_in_executor(None, self.import_plugin, filepath)
+            plugin_name = plugin_class.plugin_name
+
+            if plugin_name != old_name and plugin_name in self.plugins:
+                raise Exception("Plugin: {}: is already loaded".format(plugin_name))
+
+            if plugin_name in self.staged_event_handlers:
+                raise Exception("Plugin: {}: is already being reloaded".format(plugin_name))
+
+            self.staged_event_handlers[plugin_name] = list()
+            staged = True
+
+            plugin_module = await self.loop.run_in_executor(None, plugin_class, self)
+
+            on_load_func = getattr(plugin_module, "on_load", None)
+            if on_load_func is not None:
+                await asyncio.wait_for(on_load_func(), timeout=self.plugin_load_timeout)
+
+        except asyncio.CancelledError:
+            raise
+
+        except Exception as e:
+            logging.error("Unable to reload plugin: {}: {}".format(
+                filepath,
+                "on_load() timed out after {}s".format(self.plugin_load_timeout) if isinstance(e, asyncio.TimeoutError) else e
+            ))
+
+            on_unload_func = getattr(plugin_module, "on_unload", None)
+            if on_unload_func is not None:
+                try:
+                    on_unload_func()
+
+                except Exception as e:
+                    logging.error("on_unload() for plugin: {}: {}".format(filepath, e))
+
+            return False
+
+        finally:
+            if staged:
+                event_handlers = self.staged_event_handlers.pop(plugin_name)
+
+        if old_name is not None:
+            self.unload_plugin(old_name)
+
+        self.add_plugin(plugin_name, plugin_module, filepath, plugin_module.bot_commands, True)
+        for event_handler in event_handlers:
+            self.register_event_handler(*event_handler)
+
+        self.rebuild_command_table()
+        self.event_funcs.clear()
+
+        if self.gateway_intents is not None:
+            self.check_intents(self.gateway_intents, plugin_name)
+
+        logging.info("Reloaded plugin: {} in {:.1f}ms".format(
+            plugin_name,
+            (time.perf_counter() - start) * 1000
+        ))
+
+        return True
+
+    async def load_lazy_plugin(self, name: str, function_name: str) -> Callable:
+        """Load lazy plugin name if it is not loaded yet
+        Return its function_name function once it is ready"""
+
+        plugin = self.plugins.get(name)
+
+        if plugin is not None and plugin.get("lazy"):
+            logging.info("Loading lazy plugin: {}".format(name))
+            self.load_plugin(plugin["filepath"])
+            plugin = self.plugins.get(name)
+
+        # Concurrent calls wait for the same on_load function
+        if plugin is not None and plugin.get("load_task"):
+            await asyncio.shield(plugin["load_task"])
+            plugin = self.plugins.get(name)
+
+        if plugin is None or plugin.get("lazy") or not plugin.get("ready"):
+            raise Exception("Unable to load plugin: {}".format(name))
+
+        return getattr(plugin["module"], function_name)
+
+    def remove_plugin_commands(self, name: str) -> None:
+        """Remove the commands of plugin name"""
+
+        for command in list(self.commands):
+            if self.commands[command]["plugin_name"] == name:
+                logging.info("Removing command {}: from {}".format(
+                    command,
+                    name
+                ))
+                del self.commands[command]
+
     def unload_plugin(self, name: str) -> bool:
         """Unload plugin by name
         Return True if plugin was unloaded, False on failure"""
@@ -198,27 +839,26 @@ class Marcel(discord.Client):
         if plugin:
             logging.info("Unloading plugin: {}".format(name))
 
-            try:
-                on_unload_func = getattr(plugin.get("module"), "on_unload")
+            if plugin.get("load_task"):
+                plugin["load_task"].cancel()
 
-                logging.info("Executing on_unload function for plugin: {}".format(name))
-                on_unload_func()
+            if not plugin.get("lazy"):
+                try:
+                    on_unload_func = getattr(plugin.get("module"), "on_unload")
 
-            except Exception as e:
-                logging.error("on_unload() for plugin: {}: {}".format(
-                    name,
-                    e
-                ))
+                    logging.info("Executing on_unload function for plugin: {}".format(name))
+                    on_unload_func()
 
-            for command in list(self.commands):
-                if self.commands[command]["plugin_name"] == name:
-                    logging.info("Removing command {}: from {}".format(
-                        command,
-                        name
+                except Exception as e:
+                    logging.error("on_unload() for plugin: {}: {}".format(
+                        name,
+                        e
                     ))
-                    del self.commands[command]
 
-            for event in self.event_handlers:
+            self.remove_plugin_commands(name)
+            self.rebuild_command_table()
+
+            for event in list(self.event_handlers):
                 self.unregister_event_handler(name, event)
 
             del plugin["module"]
@@ -243,7 +883,7 @@ class Marcel(discord.Client):
         ))
         for filename in self.plugins_path.iterdir():
             if filename.name.lower().endswith(".py"):
-                if self.load_plugin(filename):
+                if self.load_plugin(filename, lazy=self.lazy_plugins):
                     loaded_plugins += 1
 
         return loaded_plugins
@@ -284,31 +924,214 @@ class Marcel(discord.Client):
         self.unload_plugins(plugins)
         return self.load_plugins()
 
+    def rebuild_command_table(self) -> None:
+        """Rebuild the command dispatch table from the loaded plugins
+        The new table replaces the previous one in a single assignment"""
+
+        command_table = dict()
+
+        for command_name, command_info in self.commands.items():
+            plugin = self.plugins.get(command_info["plugin_name"])
+            if not plugin:
+                continue
+
+            func = getattr(plugin.get("module"), command_info["function_name"], None)
+            if func is None:
+                logging.error("Unable to bind command: {}: from {}: no function named {}".format(
+                    command_name,
+                    command_info["plugin_name"],
+                    command_info["function_name"]
+                ))
+                continue
+
+            command_table[command_name] = CommandEntry(
+                func=func,
+                plugin_name=command_info["plugin_name"],
+                function_name=command_info["function_name"],
+                clean_command="clean_command" in command_info["attributes"],
+                attributes=command_info["attributes"],
+                latency=self.latency_stats.get("command", command_info["plugin_name"], command_name),
+                warming=not plugin.get("ready", True)
+            )
+
+        self.command_table = command_table
+
     def get_command_func(self, command: str):
         """Return command function or None if it is not found"""
 
-        command_info = self.commands.get(command)
-
-        if command_info:
-            plugin = self.plugins.get(command_info["plugin_name"], dict())
-            return getattr(plugin.get("module"), command_info["function_name"])
+        entry = self.command_table.get(command)
 
-        return None
+        return entry.func if entry else None
 
-    def get_event_handler_functions(self, event_name: str) -> list:
-        """Return a list of handler functions for event_name"""
+    def build_event_handlers(self, event_name: str) -> EventHandlers:
+        """Bind and cache the handler functions for event_name"""
 
         funcs = list()
-        handlers = self.event_handlers.get(event_name)
+        handlers = list()
+
+        for handler in self.event_handlers.get(event_name, list()):
+            plugin = self.plugins.get(handler["plugin_name"])
+            if not plugin or not plugin.get("ready", True):
+                continue
+
+            module = plugin.get("module")
+            func = getattr(module, handler["function_name"], None)
+            if func:
+                funcs.append(func)
+                handlers.append(EventHandler(
+                    func=func,
+                    plugin_name=handler["plugin_name"],
+                    ordered=getattr(module, "ordered_events", False),
+                    latency=self.latency_stats.get(
+                        "event",
+                        handler["plugin_name"],
+                        "{}:{}".format(event_name, handler["function_name"])
+                    )
+                ))
 
-        if handlers:
-            for handler in handlers:
-                plugin = self.plugins.get(handler["plugin_name"], dict())
-                func = getattr(plugin.get("module"), handler["function_name"])
-                if func:
-                    funcs.append(func)
+        event_handlers = EventHandlers(
+            funcs=tuple(funcs),
+            handlers=tuple(handlers),
+            concurrent=tuple(x for x in handlers if not x.ordered),
+            ordered=tuple(x for x in handlers if x.ordered),
+            sampler=LatencySampler(self.event_sample_interval)
+        )
+        self.event_funcs[event_name] = event_handlers
+
+        return event_handlers
+
+    def get_event_handlers(self, event_name: str) -> EventHandlers:
+        """Return the EventHandlers for event_name"""
 
-        return funcs
+        handlers = self.event_funcs.get(event_name)
+
+        if handlers is None:
+            handlers = self.build_event_handlers(event_name)
+
+        return handlers
+
+    def get_event_handler_functions(self, event_name: str) -> tuple:
+        """Return a tuple of handler functions for event_name"""
+
+        return self.get_event_handlers(event_name).funcs
+
+    async def run_event_handler(self, event_name: str, handler: EventHandler, weight: int, *args) -> None:
+        """Run an event handler within the configured time budget
+        Handlers that overrun are cancelled, errors are logged
+        weight: weight of the handler's duration (0 to not time it)"""
+
+        start = time.perf_counter() if weight else None
+        try:
+            await asyncio.wait_for(handler.func(*args), timeout=self.event_handler_timeout)
+
+        except asyncio.TimeoutError:
+            handler.latency.errors += 1
+            logging.error("Event handler {}: for {}: timed out after {}s and was cancelled".format(
+                handler.func.__qualname__,
+                event_name,
+                self.event_handler_timeout
+            ))
+
+        except Exception as e:
+            handler.latency.errors += 1
+            logging.error("Event handler {}: for {}: {}".format(
+                handler.func.__qualname__,
+                event_name,
+                e
+            ))
+
+        finally:
+            if start is not None:
+                handler.latency.record(time.perf_counter() - start, weight)
+
+    async def run_ordered_event_handlers(self, event_name: str, handlers: tuple, weight: int, *args) -> None:
+        """Run event handlers one after another, each within the time budget"""
+
+        for handler in handlers:
+            await self.run_event_handler(event_name, handler, weight, *args)
+
+    def create_event_task(self, coro: Awaitable) -> asyncio.Task:
+        """Run coro in a task that is kept until it completes"""
+
+        task = self.loop.create_task(coro)
+        self.event_tasks.add(task)
+        task.add_done_callback(self.event_task_done)
+
+        return task
+
+    def event_task_done(self, task: asyncio.Task) -> None:
+        self.event_tasks.discard(task)
+
+        if not task.cancelled() and task.exception() is not None:
+            logging.error("Event task: {}".format(task.exception()))
+
+    async def run_concurrent_event_handlers(self, event_name: str, handlers: EventHandlers, weight: int, *args) -> None:
+        """Run event handlers as independent tasks (handlers of plugins with
+        ordered_events set keep running one after another)"""
+
+        tasks = [
+            self.create_event_task(self.run_event_handler(event_name, handler, weight, *args))
+            for handler in handlers.concurrent
+        ]
+
+        if handlers.ordered:
+            tasks.append(self.create_event_task(
+                self.run_ordered_event_handlers(event_name, handlers.ordered, weight, *args)
+            ))
+
+        await asyncio.gather(*tasks)
+
+    async def dispatch_event(self, event_name: str, *args) -> None:
+        """Run the handler functions registered for event_name one after
+        another, or as independent tasks if concurrent events are enabled"""
+
+        handlers = self.event_funcs.get(event_name) or self.build_event_handlers(event_name)
+
+        if not handlers.funcs:
+            return
+
+        # Only one dispatch out of the sample interval is timed
+        weight = handlers.sampler.sample()
+
+        if self.concurrent_events:
+            await self.run_concurrent_event_handlers(event_name, handlers, weight, *args)
+
+        elif not weight:
+            try:
+                for func in handlers.funcs:
+                    await func(*args)
+
+            except:
+                handlers.handlers[handlers.funcs.index(func)].latency.errors += 1
+                raise
+
+        else:
+            # Each handler ends when the next one starts
+            start = time.perf_counter()
+            for handler in handlers.handlers:
+                try:
+                    await handler.func(*args)
+
+                except:
+                    handler.latency.errors += 1
+                    raise
+
+                finally:
+                    end = time.perf_counter()
+                    handler.latency.record(end - start, weight)
+                    start = end
+
+    def get_latency_stats(self, kind: str = None) -> list:
+        """Return the latency summaries of commands and event handlers
+        kind can be "command" or "event" to only return those
+        Summaries are sorted by total time spent, durations are in seconds"""
+
+        return self.latency_stats.summary(kind)
+
+    def reset_latency_stats(self) -> None:
+        """Reset the latency statistics"""
+
+        self.latency_stats.clear()
 
     def register_event_handler(
         self,
@@ -323,6 +1146,13 @@ class Marcel(discord.Client):
         else:
             plugin_name = plugin.plugin_name
 
+        # Plugins being hot reloaded register their handlers when they replace
+        # their previous version
+        staged = self.staged_event_handlers.get(plugin_name)
+        if staged is not None and plugin is not self.plugins.get(plugin_name, dict()).get("module"):
+            staged.append((plugin_name, event_name, function_name))
+            return
+
         if not event_name in self.event_handlers:
             self.event_handlers[event_name] = list()
 
@@ -335,6 +1165,7 @@ class Marcel(discord.Client):
             "plugin_name": plugin_name,
             "function_name": function_name,
         })
+        self.event_funcs.pop(event_name, None)
 
     def unregister_event_handler(
         self,
@@ -355,47 +1186,47 @@ class Marcel(discord.Client):
             plugin_name
         ))
         if event_name in self.event_handlers:
-            for handler in self.event_handlers[event_name]:
-                if handler["plugin_name"] == plugin_name:
-                    if function_name == None or handler["function_name"] == function_name:
-                        self.event_handlers[event_name].remove(handler)
+            self.event_handlers[event_name] = [
+                handler for handler in self.event_handlers[event_name]
+                if not (handler["plugin_name"] == plugin_name
+                    and (function_name == None or handler["function_name"] == function_name))
+            ]
+            self.event_funcs.pop(event_name, None)
 
     def load_server_settings(self) -> None:
-        """Load server settings from servers.json"""
-
-        if self.servers_file.exists():
-            logging.info("Loading server settings from {}".format(self.servers_file))
+        """Load server settings (from servers.json or servers.db)"""
 
-            with self.servers_file.open("r") as h:
-                self.server_settings = json.load(h)
+        self.settings_store.load()
 
-        else:
-            self.server_settings = dict()
+    def save_server_settings(self) -> None:
+        """Save server settings (to servers.json or servers.db)"""
 
-        self.server_settings_diff = self.server_settings.copy()
+        self.settings_store.save()
 
-    def save_server_settings(self) -> None:
-        """Save server settings to servers.json"""
+    def get_server_settings(self, guild: Union[discord.Guild, int]) -> GuildSettings:
+        """Return server settings for the given guild (a dict-like overlay of
+        the guild's settings over server_defaults)
+        Changes to the returned settings are saved automatically"""
 
-        logging.info("Saving server settings to {}".format(self.servers_file))
-        with self.servers_file.open("w") as h:
-            json.dump(self.server_settings, h, indent=4)
+        if isinstance(guild, discord.Guild):
+            guild_id = str(guild.id)
+        else:
+            guild_id = str(guild)
 
-        self.server_settings_diff = self.server_settings.copy()
+        return self.settings_store.get(guild_id)
 
-    def get_server_settings(self, guild: Union[discord.Guild, int]) -> dict:
-        """Return server settings dict() for the given guild"""
+    def reset_server_settings(self, guild: Union[discord.Guild, int]) -> GuildSettings:
+        """Reset server settings of the given guild to the default values
+        Return the new server settings"""
 
         if isinstance(guild, discord.Guild):
             guild_id = str(guild.id)
         else:
             guild_id = str(guild)
 
-        if not guild_id in self.server_settings:
-            logging.debug("Creating default settings for guild: {}".format(guild_id))
-            self.server_settings[guild_id] = self.cfg.get("server_defaults", dict()).copy()
+        self.settings_store.reset(guild_id)
 
-        return self.server_settings.get(guild_id)
+        return self.settings_store.get(guild_id)
 
     def get_server_mediaplayer(self, guild: discord.Guild) -> MarcelMediaPlayer:
         """Return server MarcelMediaPlayer for the given guild"""
@@ -412,7 +1243,13 @@ class Marcel(discord.Client):
                 volume_limit=guild_settings.get("volume_limit", 1.0),
                 player_queue_limit=self.cfg.get("voice_client", dict()).get("player_queue_limit", 20),
                 duration_limit=self.cfg.get("voice_client", dict()).get("duration_limit", 1800),
-                idle_limit=self.cfg.get("voice_client", dict()).get("idle_limit", 0)
+                idle_limit=self.cfg.get("voice_client", dict()).get("idle_limit", 0),
+                extractors=self.cfg.get("voice_client", dict()).get("extractors"),
+                ytdl_cache_dir=self.cfg.get("voice_client", dict()).get("cache_dir"),
+                media_cache=self.media_cache,
+                extraction_pool=self.extraction_pool,
+                lookahead=self.cfg.get("voice_client", dict()).get("lookahead", 2),
+                playback_ttls=self.cfg.get("voice_client", dict()).get("playback_ttls")
             )
 
             # Bind event handlers
@@ -422,6 +1259,75 @@ class Marcel(discord.Client):
 
         return self.media_players.get(guild_id)
 
+    def get_shard_latencies(self) -> list:
+        """Return the latency of each gateway connection as (shard_id, latency) tuples"""
+
+        return [(self.shard_id or 0, self.latency)]
+
+    def get_guild_latency(self, guild: discord.Guild) -> float:
+        """Return the latency of the gateway connection serving guild"""
+
+        return self.latency
+
+    def get_shard_summary(self) -> list:
+        """Return a dict() for each gateway connection with its shard_id,
+        latency and its number of guilds, members and media players"""
+
+        summary = {
+            shard_id: {
+                "shard_id": shard_id,
+                "latency": latency,
+                "guilds": 0,
+                "members": 0,
+                "media_players": 0
+            }
+            for shard_id, latency in self.get_shard_latencies()
+        }
+
+        for guild in self.guilds:
+            shard = summary.get(guild.shard_id or 0)
+            if shard is not None:
+                shard["guilds"] += 1
+                shard["members"] += guild.member_count or 0
+
+        for mp in list(self.media_players.values()):
+            shard = summary.get(mp.guild.shard_id or 0)
+            if shard is not None:
+                shard["media_players"] += 1
+
+        return [summary[shard_id] for shard_id in sorted(summary)]
+
+    def get_server_list(self) -> dict:
+        """Return the servers the bot is in and its shards
+        guilds: list of dict() with the name, description and member_count of each guild
+        shards: the shards summary (see get_shard_summary)"""
+
+        return {
+            "guilds": [
+                {
+                    "name": guild.name,
+                    "description": guild.description,
+                    "member_count": guild.member_count or 0
+                }
+                for guild in self.guilds
+            ],
+            "shards": self.get_shard_summary()
+        }
+
+    async def broadcast_action(self, action: str) -> list:
+        """Run a cluster action (see cluster_actions) on all the workers of the
+        cluster, or only on this bot if it is not running as a cluster
+        Return a list of (worker_id, result, error) tuples"""
+
+        if self.cluster:
+            return await self.cluster.broadcast(action)
+
+        try:
+            return [(0, self.cluster_actions[action](), None)]
+
+        except Exception as e:
+            return [(0, None, str(e))]
+
     def is_member_owner(self, member: discord.Member) -> bool:
         """Return True if member is an owner"""
 
@@ -461,6 +1367,10 @@ class Marcel(discord.Client):
             pass
 
     async def on_message(self, message: discord.Message) -> None:
+        if self.concurrent_events and self.get_event_handlers("on_message").funcs:
+            # Don't make the handlers wait for the command to complete
+            self.create_event_task(self.dispatch_event("on_message", message))
+
         if not (self.is_me(message.author) or not isinstance(message.channel, discord.abc.GuildChannel)):
             guild_settings = self.get_server_settings(message.guild)
             prefix = guild_settings.get("prefix", "!!")
@@ -470,15 +1380,35 @@ class Marcel(discord.Client):
                 command = args[0][len(prefix):]
                 del args[0]
 
-                func = self.get_command_func(command)
-                if func:
-                    if "clean_command" in self.commands.get(command).get("attributes") and guild_settings.get("clean_commands", False):
+                entry = self.command_table.get(command)
+                if entry:
+                    if entry.clean_command and guild_settings.get("clean_commands", False):
                         await self.clean_command(message)
 
-                    await func(
-                        message, args,
-                        settings=guild_settings, mediaplayer=self.get_server_mediaplayer(message.guild)
-                    )
+                    if entry.warming:
+                        await message.channel.send(
+                            embed=embed_message(
+                                "Warming up",
+                                discord.Color.orange(),
+                                "{} is still loading, try again in a few seconds".format(entry.plugin_name)
+                            ),
+                            delete_after=guild_settings.get("delete_after")
+                        )
+
+                    else:
+                        start = time.perf_counter()
+                        try:
+                            await entry.func(
+                                message, args,
+                                settings=guild_settings, mediaplayer=self.get_server_mediaplayer(message.guild)
+                            )
+
+                        except:
+                            entry.latency.errors += 1
+                            raise
+
+                        finally:
+                            entry.latency.record(time.perf_counter() - start)
 
                 elif len(command) > 0:
                     if guild_settings.get("clean_commands", False):
@@ -493,12 +1423,19 @@ class Marcel(discord.Client):
                         delete_after=guild_settings.get("delete_after")
                     )
 
-        for func in self.get_event_handler_functions("on_message"):
-            await func(message)
+        if not self.concurrent_events:
+            await self.dispatch_event("on_message", message)
 
     async def on_ready(self) -> None:
         await self.load_owners()
 
+        if self.metrics_exporter:
+            try:
+                await self.metrics_exporter.start()
+
+            except Exception as e:
+                logging.error("Unable to start metrics exporter: {}".format(e))
+
         logging.warning("Logged in as: {}#{} ({})".format(
             self.user.name,
             self.user.discriminator,
@@ -510,119 +1447,159 @@ class Marcel(discord.Client):
             guilds_str.append(guild.name)
 
         logging.warning("Bot is in {} servers".format(len(self.guilds)))
+        if not self.startup_reported:
+            self.startup_reported = True
+            logging.warning("Ready in {:.1f}s, using {:.1f} MiB of memory".format(
+                time.perf_counter() - self.init_time,
+                get_rss() / 1048576
+            ))
+        if self.shard_count:
+            logging.warning("Bot is running shards {} ({} in total)".format(
+                ", ".join(str(x[0]) for x in self.get_shard_latencies()),
+                self.shard_count
+            ))
 
-        for func in self.get_event_handler_functions("on_ready"):
-            await func()
+        await self.dispatch_event("on_ready")
 
     async def on_connect(self) -> None:
-        for func in self.get_event_handler_functions("on_connect"):
-            await func()
+        await self.dispatch_event("on_connect")
 
     async def on_disconnect(self) -> None:
-        for func in self.get_event_handler_functions("on_disconnect"):
-            await func()
+        await self.dispatch_event("on_disconnect")
 
     async def on_resumed(self) -> None:
-        for func in self.get_event_handler_functions("on_resumed"):
-            await func()
+        await self.dispatch_event("on_resumed")
 
     async def on_typing(
         self,
         channel: discord.abc.Messageable,
         user: Union[discord.User, discord.Member],
         when: datetime.datetime) -> None:
-        for func in self.get_event_handler_functions("on_typing"):
-            await func(channel, user, when)
+        await self.dispatch_event("on_typing", channel, user, when)
 
     async def on_message_delete(self, message: discord.Message) -> None:
-        for func in self.get_event_handler_functions("on_message_delete"):
-            await func(message)
+        await self.dispatch_event("on_message_delete", message)
 
     async def on_bulk_message_delete(self, messages: list) -> None:
-        for func in self.get_event_handler_functions("on_bulk_message_delete"):
-            await func(messages)
+        await self.dispatch_event("on_bulk_message_delete", messages)
 
     async def on_message_edit(self, before: discord.Message, after: discord.Message) -> None:
-        for func in self.get_event_handler_functions("on_message_edit"):
-            await func(before, after)
+        await self.dispatch_event("on_message_edit", before, after)
 
     async def on_reaction_add(self, reaction: discord.Reaction, user: Union[discord.Member, discord.User]) -> None:
-        for func in self.get_event_handler_functions("on_reaction_add"):
-            await func(reaction, user)
+        await self.dispatch_event("on_reaction_add", reaction, user)
 
     async def on_reaction_remove(self, reaction: discord.Reaction, user: Union[discord.Member, discord.User]) -> None:
-        for func in self.get_event_handler_functions("on_reaction_remove"):
-            await func(reaction, user)
+        await self.dispatch_event("on_reaction_remove", reaction, user)
 
     async def on_reaction_clear(self, message: discord.Message, reactions: list) -> None:
-        for func in self.get_event_handler_functions("on_reaction_clear"):
-            await func(message, reactions)
+        await self.dispatch_event("on_reaction_clear", message, reactions)
 
     async def on_reaction_clear_emoji(self, reaction: discord.Reaction) -> None:
-        for func in self.get_event_handler_functions("on_reaction_clear_emoji"):
-            await func(reaction)
+        await self.dispatch_event("on_reaction_clear_emoji", reaction)
 
     async def on_member_join(self, member: discord.Member) -> None:
-        for func in self.get_event_handler_functions("on_member_join"):
-            await func(member)
+        await self.dispatch_event("on_member_join", member)
 
     async def on_member_remove(self, member: discord.Member) -> None:
-        for func in self.get_event_handler_functions("on_member_remove"):
-            await func(member)
+        await self.dispatch_event("on_member_remove", member)
 
     async def on_member_update(self, before: discord.Member, after: discord.Member) -> None:
-        for func in self.get_event_handler_functions("on_member_update"):
-            await func(before, after)
+        await self.dispatch_event("on_member_update", before, after)
 
     async def on_guild_join(self, guild: discord.Guild) -> None:
-        for func in self.get_event_handler_functions("on_guild_join"):
-            await func(guild)
+        await self.dispatch_event("on_guild_join", guild)
 
     async def on_guild_remove(self, guild: discord.guild) -> None:
-        for func in self.get_event_handler_functions("on_guild_remove"):
-            await func(guild)
+        await self.dispatch_event("on_guild_remove", guild)
 
     async def on_guild_update(self, before: discord.Guild, after: discord.Guild) -> None:
-        for func in self.get_event_handler_functions("on_guild_update"):
-            await func(before, after)
+        await self.dispatch_event("on_guild_update", before, after)
 
     async def on_guild_available(self, guild: discord.Guild) -> None:
-        for func in self.get_event_handler_functions("on_guild_available"):
-            await func(guild)
+        await self.dispatch_event("on_guild_available", guild)
 
     async def on_guild_unavailable(self, guild: discord.Guild) -> None:
-        for func in self.get_event_handler_functions("on_guild_unavailable"):
-            await func(guild)
+        await self.dispatch_event("on_guild_unavailable", guild)
 
     async def on_voice_state_update(self, member: discord.Member, before: discord.VoiceState, after: discord.VoiceState) -> None:
-        for func in self.get_event_handler_functions("on_voice_state_update"):
-            await func(member, before, after)
+        await self.dispatch_event("on_voice_state_update", member, before, after)
 
     async def on_member_ban(self, guild: discord.Guild, user: Union[discord.User, discord.Member]) -> None:
-        for func in self.get_event_handler_functions("on_member_ban"):
-            await func(guild, user)
+        await self.dispatch_event("on_member_ban", guild, user)
 
     async def on_member_unban(self, guild: discord.Guild, user: discord.User) -> None:
-        for func in self.get_event_handler_functions("on_member_unban"):
-            await func(guild, user)
+        await self.dispatch_event("on_member_unban", guild, user)
 
     async def on_invite_create(self, invite: discord.Invite) -> None:
-        for func in self.get_event_handler_functions("on_invite_create"):
-            await func(invite)
+        await self.dispatch_event("on_invite_create", invite)
 
     async def on_invite_delete(self, invite: discord.Invite) -> None:
-        for func in self.get_event_handler_functions("on_invite_delete"):
-            await func(invite)
+        await self.dispatch_event("on_invite_delete", invite)
 
     # MarcelMediaPlayer event handlers
     async def on_voice_join(self, channel: discord.VoiceChannel, player: MarcelMediaPlayer):
-        for func in self.get_event_handler_functions("on_voice_join"):
-            await func(channel, player)
+        await self.dispatch_event("on_voice_join", channel, player)
 
     async def on_voice_leave(self, channel: discord.VoiceChannel, player: MarcelMediaPlayer):
-        for func in self.get_event_handler_functions("on_voice_leave"):
-            await func(channel, player)
+        await self.dispatch_event("on_voice_leave", channel, player)
 
     async def on_media_play(self, media: PlayerInfo, player: MarcelMediaPlayer):
-        for func in self.get_event_handler_functions("on_media_play"):
-            await func(media, player)
\ No newline at end of file
+        await self.dispatch_event("on_media_play", media, player)
+
+class ShardedMarcel(Marcel, discord.AutoShardedClient):
+    def __init__(
+        self,
+        cfg_path: Union[str, Path],
+        plugins_path: Union[str, Path],
+        shard_ids: list = None,
+        shard_count: int = None) -> None:
+        """Marcel running multiple gateway connections (shards) in one process
+        shard_ids: shards to run (all shards by default)
+        shard_count: total number of shards (overrides the sharding configuration)"""
+
+        self.marcel_shard_ids = shard_ids
+        self.marcel_shard_count = shard_count
+
+        super(ShardedMarcel, self).__init__(cfg_path, plugins_path)
+
+    def get_client_options(self) -> dict:
+        options = super(ShardedMarcel, self).get_client_options()
+
+        shard_count = self.marcel_shard_count
+        if shard_count is None:
+            shard_count = self.cfg.get("sharding", dict()).get("shard_count", "auto")
+
+        if shard_count != "auto":
+            options["shard_count"] = int(shard_count)
+
+            if self.marcel_shard_ids is not None:
+                options["shard_ids"] = list(self.marcel_shard_ids)
+
+        elif self.marcel_shard_ids is not None:
+            raise Exception("shard_ids requires a shard_count")
+
+        return options
+
+    def get_shard_latencies(self) -> list:
+        return self.latencies
+
+    def get_guild_latency(self, guild: discord.Guild) -> float:
+        shard = self.get_shard(guild.shard_id)
+
+        return shard.latency if shard is not None else self.latency
+
+    # Bot events for each shard
+    async def on_shard_ready(self, shard_id: int) -> None:
+        logging.info("Shard {} is ready".format(shard_id))
+        await self.dispatch_event("on_shard_ready", shard_id)
+
+    async def on_shard_connect(self, shard_id: int) -> None:
+        await self.dispatch_event("on_shard_connect", shard_id)
+
+    async def on_shard_disconnect(self, shard_id: int) -> None:
+        logging.warning("Shard {} disconnected".format(shard_id))
+        await self.dispatch_event("on_shard_disconnect", shard_id)
+
+    async def on_shard_resumed(self, shard_id: int) -> None:
+        await self.dispatch_event("on_shard_resumed", shard_id)
@@ -0,0 +1,397 @@
+from typing import Union
+from pathlib import Path
+from multiprocessing.connection import Connection, wait
+from urllib.request import Request, urlopen
+from marcel.bot import ShardedMarcel
+import multiprocessing
+import asyncio
+import logging
+import json
+import time
+
+"""
+    Marcel the Discord Bot
+    Copyright (C) 2019-2020  akrocynova
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# Messages exchanged over the pipes (tuples):
+# worker -> supervisor: ("broadcast", request_id, action)
+# supervisor -> workers: ("run", origin, request_id, action)
+# worker -> supervisor: ("result", origin, request_id, result, error)
+# supervisor -> origin: ("results", request_id, [(worker_id, result, error), ...])
+
+def get_recommended_shard_count(token: str) -> int:
+    """Return the number of shards recommended by Discord for the bot"""
+
+    request = Request(
+        "https://discord.com/api/v8/gateway/bot",
+        headers={
+            "Authorization": "Bot {}".format(token),
+            "User-Agent": "DiscordBot (https://github.com/hoot-w00t/marcel-the-bot)"
+        }
+    )
+
+    with urlopen(request, timeout=30) as h:
+        return json.load(h).get("shards", 1)
+
+def split_shards(shard_count: int, worker_count: int) -> list:
+    """Split the shard IDs in worker_count contiguous ranges of the same size (+/- 1)"""
+
+    return [
+        list(range(shard_count * i // worker_count, shard_count * (i + 1) // worker_count))
+        for i in range(worker_count)
+    ]
+
+class ClusterClient:
+    def __init__(self, marcel, conn: Connection, worker_id: int) -> None:
+        """Worker side of the cluster IPC channel
+        marcel: Marcel instance running in this worker
+        conn: pipe to the supervisor
+        worker_id: ID of this worker"""
+
+        self.marcel = marcel
+        self.conn = conn
+        self.worker_id = worker_id
+        self.loop = None
+        self.request_id = 0
+        self.requests = dict()
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Start receiving messages from the supervisor"""
+
+        self.loop = loop
+        self.loop.add_reader(self.conn.fileno(), self.receive)
+
+    def stop(self) -> None:
+        """Stop receiving messages from the supervisor"""
+
+        if self.loop is not None:
+            self.loop.remove_reader(self.conn.fileno())
+            self.loop = None
+
+    def receive(self) -> None:
+        try:
+            while self.conn.poll():
+                message = self.conn.recv()
+
+                if message[0] == "run":
+                    self.loop.create_task(self.run_action(*message[1:]))
+
+                elif message[0] == "results":
+                    future = self.requests.get(message[1])
+                    if future is not None and not future.done():
+                        future.set_result(message[2])
+
+        except (EOFError, OSError):
+            logging.critical("Lost connection to the cluster supervisor, closing")
+            self.loop.create_task(self.marcel.close())
+            self.stop()
+
+    async def run_action(self, origin: int, request_id: int, action: str) -> None:
+        """Run a cluster action requested by worker origin and send back its result"""
+
+        result, error = None, None
+
+        try:
+            func = self.marcel.cluster_actions.get(action)
+            if func is None:
+                raise Exception("Unknown cluster action: {}".format(action))
+
+            result = func()
+            if asyncio.iscoroutine(result):
+                result = await result
+
+        except Exception as e:
+            logging.error("Cluster action: {}: {}".format(action, e))
+            error = str(e)
+
+        self.conn.send(("result", origin, request_id, result, error))
+
+    async def broadcast(self, action: str, timeout: float = 30.0) -> list:
+        """Run a cluster action on all workers (including this one)
+        Return a list of (worker_id, result, error) tuples"""
+
+        self.request_id += 1
+        request_id = self.request_id
+        future = self.loop.create_future()
+        self.requests[request_id] = future
+
+        try:
+            self.conn.send(("broadcast", request_id, action))
+            return await asyncio.wait_for(future, timeout=timeout)
+
+        finally:
+            del self.requests[request_id]
+
+def run_worker(
+    cfg_path: str,
+    plugins_path: str,
+    worker_id: int,
+    shard_ids: list,
+    shard_count: int,
+    conn: Connection) -> None:
+    """Worker process entry point, runs a ShardedMarcel for shard_ids"""
+
+    marcel = ShardedMarcel(
+        cfg_path,
+        plugins_path,
+        shard_ids=shard_ids,
+        shard_count=shard_count
+    )
+    marcel.cluster = ClusterClient(marcel, conn, worker_id)
+
+    # Each worker serves its metrics on its own port
+    if marcel.metrics_exporter:
+        marcel.metrics_exporter.port += worker_id
+
+    marcel.run()
+
+class ClusterWorker:
+    """Supervisor side state of a worker process"""
+
+    def __init__(self, worker_id: int, shard_ids: list) -> None:
+        self.worker_id = worker_id
+        self.shard_ids = shard_ids
+        self.process = None
+        self.conn = None
+        self.started_at = 0.0
+        self.restart_at = None
+        self.restart_delay = 1.0
+
+class ClusterSupervisor:
+    # Workers that crash sooner than this after starting are restarted
+    # with an increasing delay
+    min_uptime = 60.0
+    max_restart_delay = 300.0
+    broadcast_timeout = 25.0
+
+    def __init__(
+        self,
+        cfg_path: Union[str, Path],
+        plugins_path: Union[str, Path],
+        worker_count: int,
+        shard_count: int) -> None:
+        """Run and supervise worker_count processes sharing shard_count shards"""
+
+        self.cfg_path = str(cfg_path)
+        self.plugins_path = str(plugins_path)
+        self.shard_count = shard_count
+        self.context = multiprocessing.get_context("spawn")
+        self.workers = [
+            ClusterWorker(worker_id, shard_ids)
+            for worker_id, shard_ids in enumerate(split_shards(shard_count, worker_count))
+        ]
+        self.broadcasts = dict()
+        self.stopping = False
+
+    def start_worker(self, worker: ClusterWorker) -> None:
+        logging.warning("Starting worker {} (shards {}-{} of {})".format(
+            worker.worker_id,
+            worker.shard_ids[0],
+            worker.shard_ids[-1],
+            self.shard_count
+        ))
+
+        conn, worker_conn = self.context.Pipe()
+        worker.conn = conn
+        worker.process = self.context.Process(
+            target=run_worker,
+            name="marcel-worker-{}".format(worker.worker_id),
+            args=(
+                self.cfg_path,
+                self.plugins_path,
+                worker.worker_id,
+                worker.shard_ids,
+                self.shard_count,
+                worker_conn
+            )
+        )
+        worker.process.start()
+        worker_conn.close()
+        worker.started_at = time.monotonic()
+        worker.restart_at = None
+
+    def on_worker_exit(self, worker: ClusterWorker) -> None:
+        exitcode = worker.process.exitcode
+        worker.process = None
+        worker.conn.close()
+        worker.conn = None
+
+        # Pending broadcasts will not get a result from this worker, and the
+        # results of its own broadcasts have nowhere to go
+        for key, broadcast in list(self.broadcasts.items()):
+            if key[0] == worker.worker_id:
+                del self.broadcasts[key]
+
+            elif worker.worker_id in broadcast["waiting"]:
+                broadcast["results"][worker.worker_id] = (None, "Worker exited")
+                broadcast["waiting"].discard(worker.worker_id)
+                self.complete_broadcast(key)
+
+        if self.stopping or exitcode == 0:
+            logging.warning("Worker {} stopped".format(worker.worker_id))
+            return
+
+        if time.monotonic() - worker.started_at >= self.min_uptime:
+            worker.restart_delay = 1.0
+        else:
+            worker.restart_delay = min(worker.restart_delay * 2, self.max_restart_delay)
+
+        logging.error("Worker {} exited with code {}, restarting in {:.0f}s".format(
+            worker.worker_id,
+            exitcode,
+            worker.restart_delay
+        ))
+        worker.restart_at = time.monotonic() + worker.restart_delay
+
+    def on_worker_message(self, worker: ClusterWorker, message: tuple) -> None:
+        if message[0] == "broadcast":
+            key = (worker.worker_id, message[1])
+            running = [x for x in self.workers if x.process is not None]
+
+            self.broadcasts[key] = {
+                "waiting": set(x.worker_id for x in running),
+                "results": dict(),
+                "deadline": time.monotonic() + self.broadcast_timeout
+            }
+            for x in self.workers:
+                if x.process is None:
+                    self.broadcasts[key]["results"][x.worker_id] = (None, "Worker is not running")
+
+            for x in running:
+                x.conn.send(("run", worker.worker_id, message[1], message[2]))
+
+        elif message[0] == "result":
+            key = (message[1], message[2])
+            broadcast = self.broadcasts.get(key)
+
+            if broadcast is not None:
+                broadcast["results"][worker.worker_id] = (message[3], message[4])
+                broadcast["waiting"].discard(worker.worker_id)
+                self.complete_broadcast(key)
+
+    def complete_broadcast(self, key: tuple, force: bool = False) -> None:
+        """Send the results of a broadcast to its origin once all workers answered"""
+
+        broadcast = self.broadcasts[key]
+
+        if broadcast["waiting"] and not force:
+            return
+
+        for worker_id in broadcast["waiting"]:
+            broadcast["results"][worker_id] = (None, "Timed out")
+
+        del self.broadcasts[key]
+
+        origin = self.workers[key[0]]
+        if origin.conn is not None:
+            origin.conn.send(("results", key[1], [
+                (worker_id, ) + broadcast["results"][worker_id]
+                for worker_id in sorted(broadcast["results"])
+            ]))
+
+    def run(self) -> int:
+        """Run the cluster until all workers stopped (blocking)"""
+
+        for worker in self.workers:
+            self.start_worker(worker)
+
+        try:
+            while True:
+                running = [x for x in self.workers if x.process is not None]
+                restarting = [x for x in self.workers if x.restart_at is not None]
+
+                if not running and not restarting:
+                    break
+
+                now = time.monotonic()
+                deadlines = [x.restart_at for x in restarting]
+                deadlines += [x["deadline"] for x in self.broadcasts.values()]
+                timeout = max(min(deadlines) - now, 0.0) if deadlines else None
+
+                handles = dict()
+                for worker in running:
+                    handles[worker.conn] = worker
+                    handles[worker.process.sentinel] = worker
+
+                for handle in wait(list(handles), timeout=timeout):
+                    worker = handles[handle]
+                    if worker.process is None:
+                        continue
+
+                    if handle is worker.conn:
+                        try:
+                            while worker.conn.poll():
+                                self.on_worker_message(worker, worker.conn.recv())
+
+                        except (EOFError, OSError):
+                            # The worker exited, its sentinel is ready too
+                            pass
+
+                    else:
+                        worker.process.join()
+                        self.on_worker_exit(worker)
+
+                now = time.monotonic()
+                for key, broadcast in list(self.broadcasts.items()):
+                    if broadcast["deadline"] <= now:
+                        self.complete_broadcast(key, force=True)
+
+                for worker in restarting:
+                    if worker.restart_at is not None and worker.restart_at <= now:
+                        self.start_worker(worker)
+
+        except KeyboardInterrupt:
+            # The workers receive the interrupt too and close themselves
+            logging.warning("Stopping the cluster")
+            self.stopping = True
+
+            for worker in self.workers:
+                if worker.process is not None:
+                    worker.process.join(30)
+                    if worker.process.is_alive():
+                        worker.process.terminate()
+
+        return 0
+
+def run_cluster(
+    cfg_path: Union[str, Path],
+    plugins_path: Union[str, Path],
+    worker_count: int) -> int:
+    """Run Marcel in worker_count processes (blocking)"""
+
+    cfg_path = Path(cfg_path).expanduser().resolve()
+    plugins_path = Path(plugins_path).expanduser().resolve()
+
+    with cfg_path.joinpath("config.json").open("r") as h:
+        cfg = json.load(h)
+
+    logging.basicConfig(format="[%(levelname)s] [%(asctime)s] [cluster] %(message)s")
+
+    # The workers share the server settings
+    if cfg.get("server_settings", dict()).get("backend", "json") != "sqlite":
+        logging.critical("The cluster mode requires the sqlite server_settings backend")
+        return 1
+
+    shard_count = cfg.get("sharding", dict()).get("shard_count", "auto")
+    if shard_count == "auto":
+        shard_count = get_recommended_shard_count(cfg.get("token"))
+        logging.warning("Discord recommends {} shards".format(shard_count))
+
+    # Each worker needs at least one shard
+    shard_count = max(int(shard_count), worker_count)
+
+    return ClusterSupervisor(cfg_path, plugins_path, worker_count, shard_count).run()
@@ -0,0 +1,105 @@
+from typing import NamedTuple, Callable
+from pathlib import Path
+import ast
+
+"""
+    Marcel the Discord Bot
+    Copyright (C) 2019-2020  akrocynova
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+class PluginInfo(NamedTuple):
+    """Plugin attributes read from its source without executing it"""
+    plugin_name: str
+    plugin_description: str
+    plugin_help: str
+    plugin_intents: tuple
+    bot_commands: tuple
+    has_event_handlers: bool   # The plugin calls register_event_handler
+
+def scan_plugin(filepath: Path) -> PluginInfo:
+    """Read the attributes of the MarcelPlugin class in filepath
+    Return None if they are not literals (the plugin must be executed)"""
+
+    tree = ast.parse(filepath.read_text(), filename=str(filepath))
+    attributes = dict()
+    plugin_class = None
+
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef) and node.name == "MarcelPlugin":
+            plugin_class = node
+            break
+
+    if plugin_class is None:
+        return None
+
+    for node in plugin_class.body:
+        if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+            try:
+                attributes[node.targets[0].id] = ast.literal_eval(node.value)
+
+            except ValueError:
+                attributes.pop(node.targets[0].id, None)
+
+    plugin_name = attributes.get("plugin_name")
+    bot_commands = attributes.get("bot_commands")
+    if not isinstance(plugin_name, str) or not isinstance(bot_commands, (list, tuple)):
+        return None
+
+    has_event_handlers = any(
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Attribute)
+        and node.func.attr == "register_event_handler"
+        for node in ast.walk(tree)
+    )
+
+    return PluginInfo(
+        plugin_name=plugin_name,
+        plugin_description=attributes.get("plugin_description", ""),
+        plugin_help=attributes.get("plugin_help", ""),
+        plugin_intents=tuple(attributes.get("plugin_intents", tuple())),
+        bot_commands=tuple(tuple(command) for command in bot_commands),
+        has_event_handlers=has_event_handlers
+    )
+
+class LazyPlugin:
+    def __init__(self, info: PluginInfo, load: Callable) -> None:
+        """Stand-in for a plugin that is not loaded yet
+        info: the plugin's scanned attributes
+        load: coroutine function loading the plugin, it is called with
+              the plugin name and a function name and returns the function
+              of the loaded plugin
+
+        The plugin's command functions load it on their first call"""
+
+        self.plugin_name = info.plugin_name
+        self.plugin_description = info.plugin_description
+        self.plugin_help = info.plugin_help
+        self.plugin_intents = info.plugin_intents
+        self.bot_commands = info.bot_commands
+        self.function_names = set(
+            command[1] if len(command) > 1 else command[0] for command in info.bot_commands
+        )
+        self.load = load
+
+    def __getattr__(self, name: str) -> Callable:
+        if name not in self.__dict__.get("function_names", ()):
+            raise AttributeError(name)
+
+        async def run_command(message, args, **kwargs):
+            func = await self.load(self.plugin_name, name)
+            await func(message, args, **kwargs)
+
+        return run_command
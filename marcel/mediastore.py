@@ -0,0 +1,243 @@
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import logging
+import sqlite3
+import json
+import time
+
+"""
+    Marcel the Discord Bot
+    Copyright (C) 2019-2020  akrocynova
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# Stable media fields that are stored
+media_fields = ("title", "author", "thumbnail", "duration")
+
+class MediaStore:
+    def __init__(
+        self,
+        path: Path,
+        max_entries: int = 50000,
+        max_age: float = 604800.0,
+        flush_interval: float = 5.0) -> None:
+        """Media information and requests (searches or URLs) to media URLs
+        mappings stored in an SQLite database
+        path: database file (media.db)
+        max_entries: number of medias and of requests kept, the least
+                     recently used are removed first
+        max_age: time (in seconds) after which stored information is refetched
+        flush_interval: time (in seconds) between two writes of the changes
+
+        The database is opened on first use, reads and writes run in a
+        background thread and changes are written periodically."""
+
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.flush_interval = flush_interval
+        self.db = None
+        self.task = None
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="marcel-media")
+        self.pending = dict()
+        self.writing = dict()
+        self.used = set()
+        self.hits = 0
+
+    def connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(str(self.path), timeout=30.0)
+
+        # auto_vacuum only applies to new databases
+        db.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+
+        with db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS media (url TEXT PRIMARY KEY, title TEXT, author TEXT, "
+                "thumbnail TEXT, duration INTEGER, updated REAL NOT NULL, used REAL NOT NULL)"
+            )
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS requests (request TEXT PRIMARY KEY, urls TEXT NOT NULL, "
+                "playlist INTEGER NOT NULL, updated REAL NOT NULL, used REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS media_used ON media (used)")
+            db.execute("CREATE INDEX IF NOT EXISTS requests_used ON requests (used)")
+
+        return db
+
+    def get_db(self) -> sqlite3.Connection:
+        if self.db is None:
+            logging.info("Opening media store: {}".format(self.path))
+            self.db = self.connect()
+
+        return self.db
+
+    def read(self, request: str) -> tuple:
+        """Return the stored (playlist, medias) of request, or None (blocking)"""
+
+        db = self.get_db()
+        min_updated = time.time() - self.max_age
+
+        row = db.execute(
+            "SELECT urls, playlist FROM requests WHERE request = ? AND updated > ?",
+            (request, min_updated)
+        ).fetchone()
+        if row is None:
+            return None
+
+        medias = list()
+        for url in json.loads(row[0]):
+            media = db.execute(
+                "SELECT title, author, thumbnail, duration FROM media WHERE url = ? AND updated > ?",
+                (url, min_updated)
+            ).fetchone()
+
+            # Medias are removed independently of the requests
+            if media is None:
+                return None
+
+            medias.append(dict(zip(media_fields, media), url=url))
+
+        return bool(row[1]), medias
+
+    async def get(self, request: str) -> tuple:
+        """Return the stored (playlist, medias) of request, or None
+        medias is a list of dictionaries with the url and media_fields keys"""
+
+        if request in self.pending:
+            result = self.pending[request]
+
+        elif request in self.writing:
+            result = self.writing[request]
+
+        else:
+            loop = asyncio.get_event_loop()
+            result = await loop.run_in_executor(self.executor, self.read, request)
+
+        if result is not None:
+            self.hits += 1
+            self.used.add(request)
+            self.used.update(x["url"] for x in result[1])
+
+        return result
+
+    def put(self, request: str, playlist: bool, medias: list) -> None:
+        """Store the medias of request, they are written on the next flush
+        medias: list of dictionaries with the url and media_fields keys"""
+
+        self.pending[request] = (playlist, medias)
+
+    def write_changes(self, changes: dict, used: set) -> None:
+        db = self.get_db()
+        now = time.time()
+
+        with db:
+            for request, (playlist, medias) in changes.items():
+                db.executemany(
+                    "INSERT OR REPLACE INTO media VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        (x["url"], ) + tuple(x.get(field) for field in media_fields) + (now, now)
+                        for x in medias
+                    )
+                )
+                db.execute(
+                    "INSERT OR REPLACE INTO requests VALUES (?, ?, ?, ?, ?)",
+                    (request, json.dumps([x["url"] for x in medias]), int(playlist), now, now)
+                )
+
+            for table, column in (("media", "url"), ("requests", "request")):
+                db.executemany(
+                    "UPDATE {} SET used = ? WHERE {} = ?".format(table, column),
+                    ((now, key) for key in used)
+                )
+
+        self.compact()
+
+    def compact(self) -> None:
+        """Remove the expired and least recently used entries once there
+        are more than max_entries (blocking)"""
+
+        db = self.get_db()
+        removed = 0
+
+        with db:
+            for table in ("media", "requests"):
+                removed += db.execute(
+                    "DELETE FROM {} WHERE updated <= ?".format(table),
+                    (time.time() - self.max_age, )
+                ).rowcount
+
+                count = db.execute("SELECT COUNT(*) FROM {}".format(table)).fetchone()[0]
+                if count > self.max_entries:
+                    # Remove 10% more to compact less often
+                    removed += db.execute(
+                        "DELETE FROM {0} WHERE rowid IN (SELECT rowid FROM {0} ORDER BY used LIMIT ?)".format(table),
+                        (count - int(self.max_entries * 0.9), )
+                    ).rowcount
+
+        if removed > 0:
+            db.execute("PRAGMA incremental_vacuum").fetchall()
+            logging.info("Removed {} entries from the media store".format(removed))
+
+    async def flush(self) -> None:
+        """Write the changes without blocking the event loop"""
+
+        if not self.pending and not self.used:
+            return
+
+        loop = asyncio.get_event_loop()
+        changes, self.pending = self.pending, dict()
+        used, self.used = self.used, set()
+        self.writing = changes
+
+        try:
+            await loop.run_in_executor(self.executor, self.write_changes, changes, used)
+
+        except:
+            # Write the changes again on the next flush (newer ones first)
+            changes.update(self.pending)
+            self.pending = changes
+            self.used.update(used)
+            raise
+
+        finally:
+            self.writing = dict()
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Start flushing changes periodically"""
+
+        if self.task is None or self.task.done():
+            self.task = loop.create_task(self.run())
+
+    async def stop(self) -> None:
+        """Stop flushing changes periodically and flush the remaining ones"""
+
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+        await self.flush()
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+
+            try:
+                await self.flush()
+
+            except Exception as e:
+                logging.error("Unable to flush media store: {}".format(e))
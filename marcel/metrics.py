@@ -0,0 +1,300 @@
+from marcel.voice import MarcelMediaPlayer
+from marcel.monitor import LoopLagMonitor, LoopWatchdog
+import asyncio
+import discord
+import logging
+import math
+
+"""
+    Marcel the Discord Bot
+    Copyright (C) 2019-2020  akrocynova
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+def format_value(value: float) -> str:
+    """Format a sample value for the Prometheus text format"""
+
+    if isinstance(value, int):
+        return str(value)
+    if value is None or math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+
+    return repr(float(value))
+
+def format_labels(labels: dict) -> str:
+    """Format sample labels for the Prometheus text format"""
+
+    if not labels:
+        return ""
+
+    return "{{{}}}".format(",".join(
+        "{}=\"{}\"".format(
+            name,
+            str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        )
+        for name, value in labels.items()
+    ))
+
+class MetricsWriter:
+    """Prometheus text format writer"""
+
+    def __init__(self) -> None:
+        self.lines = list()
+
+    def add(self, name: str, metric_type: str, description: str, samples: list) -> None:
+        """Add a metric
+        samples is a list of (labels, value) tuples, labels can be None"""
+
+        self.lines.append("# HELP {} {}".format(name, description))
+        self.lines.append("# TYPE {} {}".format(name, metric_type))
+
+        for labels, value in samples:
+            self.lines.append("{}{} {}".format(name, format_labels(labels), format_value(value)))
+
+    def text(self) -> str:
+        return "\n".join(self.lines) + "\n"
+
+class MetricsExporter:
+    def __init__(
+        self,
+        marcel,
+        lag_monitor: LoopLagMonitor,
+        host: str = "127.0.0.1",
+        port: int = 9150) -> None:
+        """Prometheus-style metrics HTTP endpoint
+        marcel: Marcel instance to export metrics of
+        lag_monitor: LoopLagMonitor measuring the loop lag (started by the caller)
+        host, port: address to listen on (localhost by default)
+        Metrics are only computed when the endpoint is scraped"""
+
+        self.marcel = marcel
+        self.lag_monitor = lag_monitor
+        self.host = host
+        self.port = port
+        self.server = None
+
+    async def start(self) -> None:
+        """Start the HTTP endpoint (does nothing if it is already started)"""
+
+        if self.server is not None:
+            return
+
+        self.server = await asyncio.start_server(
+            self.handle_client,
+            host=self.host,
+            port=self.port
+        )
+        logging.info("Metrics exporter listening on {}:{}".format(self.host, self.port))
+
+    async def stop(self) -> None:
+        """Stop the HTTP endpoint"""
+
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5.0)
+
+            # Skip the request headers
+            while True:
+                line = await asyncio.wait_for(reader.readline(), timeout=5.0)
+                if line in (b"\r\n", b"\n", b""):
+                    break
+
+            request = request_line.decode("latin-1").split()
+
+            if len(request) >= 2 and request[0] == "GET" and request[1].split("?")[0] in ("/", "/metrics"):
+                status = "200 OK"
+                body = self.collect().encode("utf-8")
+            else:
+                status = "404 Not Found"
+                body = b"Not Found\n"
+
+            writer.write("HTTP/1.0 {}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\nContent-Length: {}\r\nConnection: close\r\n\r\n".format(
+                status,
+                len(body)
+            ).encode("latin-1"))
+            writer.write(body)
+            await writer.drain()
+
+        except Exception as e:
+            logging.error("Metrics exporter: {}".format(e))
+
+        finally:
+            writer.close()
+
+    def get_executor_queue_depth(self) -> int:
+        """Return the number of jobs waiting for a thread in the default executor"""
+
+        # asyncio does not expose the default executor, it is only created
+        # once something is run in it
+        executor = getattr(self.marcel.loop, "_default_executor", None)
+        work_queue = getattr(executor, "_work_queue", None)
+
+        return work_queue.qsize() if work_queue is not None else 0
+
+    def get_ffmpeg_process_count(self) -> int:
+        """Return the number of live FFmpeg subprocesses of the media players"""
+
+        count = 0
+
+        for mp in list(self.marcel.media_players.values()):
+            if not mp.is_in_voice_channel():
+                continue
+
+            source = mp.voice_client.source
+            if isinstance(source, discord.PCMVolumeTransformer):
+                source = source.original
+
+            process = getattr(source, "_process", None)
+            if process is not None and process.poll() is None:
+                count += 1
+
+        return count
+
+    def collect(self) -> str:
+        """Return all metrics in the Prometheus text format"""
+
+        metrics = MetricsWriter()
+        media_players = list(self.marcel.media_players.items())
+
+        metrics.add(
+            "marcel_event_loop_lag_seconds", "gauge",
+            "Event loop lag at the last measurement",
+            [(None, self.lag_monitor.lag)]
+        )
+        metrics.add(
+            "marcel_event_loop_max_lag_seconds", "gauge",
+            "Maximum event loop lag since the last scrape",
+            [(None, self.lag_monitor.pop_max_lag())]
+        )
+        if isinstance(self.lag_monitor, LoopWatchdog):
+            metrics.add(
+                "marcel_event_loop_stalls_total", "counter",
+                "Number of event loop stalls detected by the watchdog",
+                [(None, self.lag_monitor.stall_count)]
+            )
+        shards = self.marcel.get_shard_summary()
+        metrics.add(
+            "marcel_gateway_latency_seconds", "gauge",
+            "Latency between a gateway heartbeat and its acknowledgement",
+            [({"shard": x["shard_id"]}, x["latency"]) for x in shards]
+        )
+        metrics.add(
+            "marcel_guilds", "gauge",
+            "Number of guilds the bot is in",
+            [({"shard": x["shard_id"]}, x["guilds"]) for x in shards]
+        )
+        metrics.add(
+            "marcel_media_players", "gauge",
+            "Number of live media players",
+            [(None, len(media_players))]
+        )
+        metrics.add(
+            "marcel_voice_clients", "gauge",
+            "Number of connected voice clients",
+            [(None, len(self.marcel.voice_clients))]
+        )
+        metrics.add(
+            "marcel_player_queue_length", "gauge",
+            "Number of medias in the player queue of a guild",
+            [({"guild": guild_id}, len(mp.player_queue)) for guild_id, mp in media_players]
+        )
+        metrics.add(
+            "marcel_ytdl_fetch_inflight", "gauge",
+            "Number of youtube-dl requests in progress",
+            [(None, MarcelMediaPlayer.ytdl_inflight)]
+        )
+        metrics.add(
+            "marcel_ytdl_fetch_coalesced_total", "counter",
+            "Number of youtube-dl requests that waited for an identical one in progress",
+            [(None, MarcelMediaPlayer.ytdl_scheduler.coalesced)]
+        )
+        metrics.add(
+            "marcel_ytdl_queue_depth", "gauge",
+            "Number of youtube-dl requests waiting to be extracted by priority",
+            [({"priority": name}, depth) for name, depth in MarcelMediaPlayer.ytdl_scheduler.queue_depth().items()]
+        )
+        metrics.add(
+            "marcel_ytdl_fetch_dropped_total", "counter",
+            "Number of queued youtube-dl requests dropped because they were cancelled",
+            [(None, MarcelMediaPlayer.ytdl_scheduler.dropped)]
+        )
+        metrics.add(
+            "marcel_ytdl_fetch_abandoned_total", "counter",
+            "Number of running youtube-dl requests left to complete in the background because they were cancelled",
+            [(None, MarcelMediaPlayer.ytdl_scheduler.abandoned)]
+        )
+        metrics.add(
+            "marcel_ytdl_refreshes_avoided_total", "counter",
+            "Number of youtube-dl requests avoided because a playback URL was still valid",
+            [(None, MarcelMediaPlayer.ytdl_refreshes_avoided)]
+        )
+        if self.marcel.media_cache is not None:
+            metrics.add(
+                "marcel_media_cache_hits_total", "counter",
+                "Number of media requests answered from the media cache",
+                [(None, self.marcel.media_cache.hits)]
+            )
+            metrics.add(
+                "marcel_media_cache_misses_total", "counter",
+                "Number of media requests that needed youtube-dl",
+                [(None, self.marcel.media_cache.misses)]
+            )
+            metrics.add(
+                "marcel_media_cache_entries", "gauge",
+                "Number of requests in the media cache",
+                [(None, len(self.marcel.media_cache.entries))]
+            )
+        if self.marcel.media_store is not None:
+            metrics.add(
+                "marcel_media_store_hits_total", "counter",
+                "Number of media requests answered from the media store",
+                [(None, self.marcel.media_store.hits)]
+            )
+        metrics.add(
+            "marcel_executor_queue_depth", "gauge",
+            "Number of jobs waiting for a thread in the default executor",
+            [(None, self.get_executor_queue_depth())]
+        )
+        metrics.add(
+            "marcel_ffmpeg_processes", "gauge",
+            "Number of live FFmpeg subprocesses",
+            [(None, self.get_ffmpeg_process_count())]
+        )
+
+        commands = self.marcel.get_latency_stats("command")
+        metrics.add(
+            "marcel_commands_total", "counter",
+            "Number of commands run",
+            [({"plugin": x["plugin_name"], "command": x["name"]}, x["count"]) for x in commands]
+        )
+        metrics.add(
+            "marcel_command_errors_total", "counter",
+            "Number of commands that raised an error",
+            [({"plugin": x["plugin_name"], "command": x["name"]}, x["errors"]) for x in commands]
+        )
+        metrics.add(
+            "marcel_command_seconds_total", "counter",
+            "Total time spent running commands",
+            [({"plugin": x["plugin_name"], "command": x["name"]}, x["total"]) for x in commands]
+        )
+
+        return metrics.text()
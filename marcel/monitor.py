@@ -0,0 +1,202 @@
+from typing import Callable
+from collections import deque
+import asyncio
+import logging
+import threading
+import traceback
+import time
+import sys
+
+"""
+    Marcel the Discord Bot
+    Copyright (C) 2019-2020  akrocynova
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+class LoopLagMonitor:
+    def __init__(self, loop: asyncio.AbstractEventLoop, interval: float = 0.5) -> None:
+        """Event loop lag monitor
+        loop: event loop to monitor
+        interval: time (in seconds) between two measurements
+        The lag is how late the loop wakes up a task sleeping for interval"""
+
+        self.loop = loop
+        self.interval = interval
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self.task = None
+
+    def start(self) -> None:
+        """Start measuring the loop lag"""
+
+        if self.task is None or self.task.done():
+            self.task = self.loop.create_task(self.run())
+
+    def stop(self) -> None:
+        """Stop measuring the loop lag"""
+
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    def pop_max_lag(self) -> float:
+        """Return the maximum lag since the last call"""
+
+        max_lag = self.max_lag
+        self.max_lag = self.lag
+
+        return max_lag
+
+    async def run(self) -> None:
+        logging.debug("Loop lag monitor started")
+
+        while True:
+            start = self.loop.time()
+            await asyncio.sleep(self.interval)
+
+            self.lag = max(self.loop.time() - start - self.interval, 0.0)
+            if self.lag > self.max_lag:
+                self.max_lag = self.lag
+
+class LoopWatchdog(LoopLagMonitor):
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        interval: float = 0.1,
+        threshold: float = 0.25,
+        history: int = 20,
+        attribute: Callable = None) -> None:
+        """Event loop stall detector
+        loop: event loop to monitor
+        interval: time (in seconds) between two heartbeats of the loop
+        threshold: time (in seconds) after which a late heartbeat is a stall
+        history: number of stalls to remember
+        attribute: function returning a dict() describing what is running in
+                   the given frame (the stalled loop's innermost frame)
+
+        A thread captures the stack of the loop's thread when its heartbeat is
+        late by more than threshold"""
+
+        super(LoopWatchdog, self).__init__(loop, interval=interval)
+
+        self.threshold = threshold
+        self.attribute = attribute
+        self.stalls = deque(maxlen=history)
+        self.stall_count = 0
+        self.current_stall = None
+        self.heartbeat = None
+        self.loop_thread_id = None
+        self.thread = None
+        self.stop_event = threading.Event()
+
+    def start(self) -> None:
+        """Start the heartbeat and the watchdog thread
+        Must be called from the loop's thread"""
+
+        super(LoopWatchdog, self).start()
+
+        self.loop_thread_id = threading.get_ident()
+        if self.thread is None or not self.thread.is_alive():
+            self.stop_event.clear()
+            self.thread = threading.Thread(
+                target=self.watch,
+                name="marcel-watchdog",
+                daemon=True
+            )
+            self.thread.start()
+
+    def stop(self) -> None:
+        """Stop the heartbeat and the watchdog thread"""
+
+        super(LoopWatchdog, self).stop()
+        self.stop_event.set()
+        self.heartbeat = None
+
+    def get_stalls(self) -> list:
+        """Return the recent stalls (most recent last)"""
+
+        return list(self.stalls)
+
+    async def run(self) -> None:
+        logging.debug("Loop watchdog started")
+
+        while True:
+            start = self.loop.time()
+            self.heartbeat = start
+            await asyncio.sleep(self.interval)
+
+            self.lag = max(self.loop.time() - start - self.interval, 0.0)
+            if self.lag > self.max_lag:
+                self.max_lag = self.lag
+
+            stall = self.current_stall
+            if stall is not None and stall["heartbeat"] == start:
+                # The loop recovered from the stall, its lag is the stall duration
+                stall["duration"] = self.lag
+                self.current_stall = None
+                logging.warning("Event loop stalled for {:.3f}s in {}".format(
+                    stall["duration"],
+                    stall["location"]
+                ))
+
+    def watch(self) -> None:
+        """Watchdog thread"""
+
+        while not self.stop_event.wait(self.threshold / 4):
+            heartbeat = self.heartbeat
+            if heartbeat is None:
+                continue
+
+            stall = self.current_stall
+            if stall is not None and stall["heartbeat"] == heartbeat:
+                continue
+
+            stalled_for = self.loop.time() - heartbeat - self.interval
+            if stalled_for >= self.threshold:
+                try:
+                    self.capture(heartbeat, stalled_for)
+
+                except Exception as e:
+                    logging.error("Loop watchdog: {}".format(e))
+
+    def capture(self, heartbeat: float, stalled_for: float) -> None:
+        """Capture the stack of the stalled loop"""
+
+        frame = sys._current_frames().get(self.loop_thread_id)
+        if frame is None:
+            return
+
+        stall = {
+            "heartbeat": heartbeat,
+            "time": time.time() - stalled_for,
+            "duration": stalled_for,
+            "plugin_name": None,
+            "kind": None,
+            "name": None
+        }
+
+        if self.attribute is not None:
+            stall.update(self.attribute(frame))
+
+        stall["location"] = "{}{}".format(
+            stall["plugin_name"] or "the bot",
+            " ({} {})".format(stall["kind"], stall["name"]) if stall["name"] else ""
+        )
+        stall["stack"] = traceback.format_list(traceback.extract_stack(frame, limit=16))
+        del frame
+
+        self.stall_count += 1
+        self.stalls.append(stall)
+        self.current_stall = stall
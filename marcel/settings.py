@@ -0,0 +1,525 @@
+from pathlib import Path
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import logging
+import sqlite3
+import weakref
+import json
+import os
+
+"""
+    Marcel the Discord Bot
+    Copyright (C) 2019-2020  akrocynova
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+class GuildSettings(MutableMapping):
+    """Settings of a guild, a sparse overlay over the default settings
+    Only the overridden keys are stored (in overrides), changes mark the
+    guild as dirty in its store"""
+
+    __slots__ = ("store", "guild_id", "overrides", "defaults", "__weakref__")
+
+    def __init__(self, store, guild_id: str, overrides: dict, defaults: dict) -> None:
+        self.store = store
+        self.guild_id = guild_id
+        self.overrides = overrides
+        self.defaults = defaults
+
+    def __getitem__(self, key):
+        overrides = self.overrides
+        if key in overrides:
+            return overrides[key]
+
+        return self.defaults[key]
+
+    def get(self, key, default=None):
+        overrides = self.overrides
+        if key in overrides:
+            return overrides[key]
+
+        return self.defaults.get(key, default)
+
+    def __contains__(self, key) -> bool:
+        return key in self.overrides or key in self.defaults
+
+    def __iter__(self):
+        yield from self.overrides
+        for key in self.defaults:
+            if key not in self.overrides:
+                yield key
+
+    def __len__(self) -> int:
+        return len(self.overrides.keys() | self.defaults.keys())
+
+    def __repr__(self) -> str:
+        return "{}({})".format(self.__class__.__name__, dict(self))
+
+    def __setitem__(self, key, value) -> None:
+        self.overrides[key] = value
+        self.store.mark_dirty(self.guild_id)
+
+    def __delitem__(self, key) -> None:
+        # Deleting an overridden key restores its default value
+        del self.overrides[key]
+        self.store.mark_dirty(self.guild_id)
+
+    def pop(self, key, *args):
+        value = self.overrides.pop(key, *args)
+        self.store.mark_dirty(self.guild_id)
+
+        return value
+
+    def clear(self) -> None:
+        self.overrides.clear()
+        self.store.mark_dirty(self.guild_id)
+
+class SettingsStore(ABC):
+    def __init__(self, defaults: dict, flush_interval: float = 5.0) -> None:
+        """Base class of the server settings stores
+        defaults: settings of guilds that were never changed
+        flush_interval: time (in seconds) between two writes of the changes
+
+        Changes are written in the background, in order, by a single thread."""
+
+        self.defaults = defaults
+        self.flush_interval = flush_interval
+        self.dirty = set()
+        self.task = None
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="marcel-settings")
+
+    @abstractmethod
+    def load(self) -> None:
+        """Load the stored settings (blocking)"""
+
+    @abstractmethod
+    def get(self, guild_id: str) -> GuildSettings:
+        """Return the settings of guild_id, new guilds get the default settings"""
+
+    @abstractmethod
+    def reset(self, guild_id: str) -> None:
+        """Reset the settings of guild_id to the default values"""
+
+    @abstractmethod
+    async def flush(self) -> None:
+        """Write the changes without blocking the event loop"""
+
+    @abstractmethod
+    def save(self) -> None:
+        """Write all changes (blocking)"""
+
+    def mark_dirty(self, guild_id: str) -> None:
+        self.dirty.add(guild_id)
+
+    def sparse(self, settings: dict) -> dict:
+        """Return the keys of settings that override the default settings
+        (settings saved before they were sparse hold a copy of the defaults)"""
+
+        defaults = self.defaults
+
+        return {
+            key: value for key, value in settings.items()
+            if key not in defaults or defaults[key] != value
+        }
+
+    def new_guild_settings(self, guild_id: str, overrides: dict = None) -> GuildSettings:
+        return GuildSettings(
+            self,
+            guild_id,
+            self.sparse(overrides) if overrides else dict(),
+            self.defaults
+        )
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Start flushing changes periodically"""
+
+        if self.task is None or self.task.done():
+            self.task = loop.create_task(self.run())
+
+    async def stop(self) -> None:
+        """Stop flushing changes periodically and flush the remaining ones"""
+
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+        await self.flush()
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+
+            try:
+                await self.flush()
+
+            except Exception as e:
+                logging.error("Unable to flush server settings: {}".format(e))
+
+class JsonSettingsStore(SettingsStore):
+    def __init__(
+        self,
+        path: Path,
+        defaults: dict,
+        flush_interval: float = 5.0,
+        compact_after: int = 1000) -> None:
+        """Server settings stored in a JSON snapshot and an append-only journal
+        path: snapshot file (servers.json), the journal is next to it (servers.journal)
+        compact_after: number of journal records after which the journal
+                       is merged into a new snapshot
+
+        Changed guilds are written to the journal as full records, replaying
+        it over the snapshot on load restores the latest settings."""
+
+        super(JsonSettingsStore, self).__init__(defaults, flush_interval=flush_interval)
+
+        self.path = path
+        self.journal_path = path.with_suffix(".journal")
+        self.compact_after = compact_after
+        self.settings = dict()
+        self.journal_records = 0
+
+    def load(self) -> None:
+        """Load the snapshot and replay the journal over it"""
+
+        settings = dict()
+
+        if self.path.exists():
+            logging.info("Loading server settings from {}".format(self.path))
+
+            with self.path.open("r") as h:
+                settings = json.load(h)
+
+        records = 0
+        if self.journal_path.exists():
+            with self.journal_path.open("r") as h:
+                for line in h:
+                    try:
+                        record = json.loads(line)
+
+                    except ValueError:
+                        # The last record can be incomplete if the bot crashed
+                        # while it was written
+                        logging.warning("Ignoring invalid record in {}".format(self.journal_path))
+                        continue
+
+                    if record.get("settings") is None:
+                        settings.pop(record.get("guild"), None)
+                    else:
+                        settings[record.get("guild")] = record.get("settings")
+                    records += 1
+
+            if records > 0:
+                logging.info("Replayed {} records from {}".format(records, self.journal_path))
+
+        # Guilds using the default settings are created when they are used
+        self.settings = dict()
+        for guild_id, guild_settings in settings.items():
+            overrides = self.sparse(guild_settings)
+            if overrides:
+                self.settings[guild_id] = GuildSettings(self, guild_id, overrides, self.defaults)
+        self.dirty.clear()
+        self.journal_records = records
+
+    def get(self, guild_id: str) -> GuildSettings:
+        """Return the settings of guild_id, new guilds get the default settings"""
+
+        guild_settings = self.settings.get(guild_id)
+
+        if guild_settings is None:
+            logging.debug("Creating default settings for guild: {}".format(guild_id))
+            guild_settings = self.new_guild_settings(guild_id)
+            self.settings[guild_id] = guild_settings
+
+        return guild_settings
+
+    def reset(self, guild_id: str) -> None:
+        """Reset the settings of guild_id to the default values"""
+
+        if self.settings.pop(guild_id, None) is not None:
+            self.dirty.add(guild_id)
+
+    def serialize_records(self, guild_ids: set) -> list:
+        """Serialize the settings of guild_ids as journal records"""
+
+        records = list()
+
+        for guild_id in guild_ids:
+            guild_settings = self.settings.get(guild_id)
+            records.append(json.dumps({
+                "guild": guild_id,
+                "settings": (guild_settings.overrides or None) if guild_settings is not None else None
+            }))
+
+        return records
+
+    def write_journal(self, records: list) -> None:
+        with self.journal_path.open("a") as h:
+            h.write("".join("{}\n".format(record) for record in records))
+            h.flush()
+            os.fsync(h.fileno())
+
+    def write_snapshot(self, settings: dict) -> None:
+        tmp_path = self.path.with_suffix(".json.tmp")
+
+        with tmp_path.open("w") as h:
+            json.dump(settings, h, separators=(",", ":"))
+            h.flush()
+            os.fsync(h.fileno())
+
+        os.replace(str(tmp_path), str(self.path))
+
+        # The journal only holds changes already in the snapshot now
+        with self.journal_path.open("w"):
+            pass
+
+    def copy_settings(self) -> dict:
+        """Return a copy of the overridden settings that can be serialized by
+        another thread (guilds using the default settings are not saved)"""
+
+        return {
+            guild_id: dict(guild_settings.overrides)
+            for guild_id, guild_settings in self.settings.items()
+            if guild_settings.overrides
+        }
+
+    async def flush(self) -> None:
+        """Write the dirty guilds to the journal (or compact it) without
+        blocking the event loop"""
+
+        if not self.dirty:
+            return
+
+        loop = asyncio.get_event_loop()
+        dirty, self.dirty = self.dirty, set()
+
+        try:
+            if self.journal_records + len(dirty) >= self.compact_after:
+                logging.debug("Compacting server settings journal")
+                await loop.run_in_executor(self.executor, self.write_snapshot, self.copy_settings())
+                self.journal_records = 0
+
+            else:
+                records = self.serialize_records(dirty)
+                await loop.run_in_executor(self.executor, self.write_journal, records)
+                self.journal_records += len(records)
+
+        except:
+            # Write the guilds again on the next flush
+            self.dirty |= dirty
+            raise
+
+    def save(self) -> None:
+        """Write all settings to a new snapshot (blocking)"""
+
+        logging.info("Saving server settings to {}".format(self.path))
+        self.executor.submit(self.write_snapshot, self.copy_settings()).result()
+        self.dirty.clear()
+        self.journal_records = 0
+
+class SqliteSettingsStore(SettingsStore):
+    def __init__(
+        self,
+        path: Path,
+        defaults: dict,
+        flush_interval: float = 5.0,
+        cache_size: int = 1000,
+        migrate_from: Path = None) -> None:
+        """Server settings stored in an SQLite database
+        path: database file (servers.db)
+        cache_size: number of recently used guilds kept in memory
+        migrate_from: servers.json to import when the database is created
+
+        Guilds are loaded on first use, changed guilds are written back by
+        the background thread (which has its own connection)."""
+
+        super(SqliteSettingsStore, self).__init__(defaults, flush_interval=flush_interval)
+
+        self.path = path
+        self.cache_size = cache_size
+        self.migrate_from = migrate_from
+        self.cache = OrderedDict()
+        # Evicted guilds still referenced elsewhere (e.g. by a running command)
+        self.evicted = weakref.WeakValueDictionary()
+        self.pending = dict()
+        self.writing = dict()
+        self.db = None
+        self.writer_db = None
+
+    def connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(str(self.path), check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+
+        return db
+
+    def load(self) -> None:
+        """Open the database, create it and migrate servers.json if needed"""
+
+        logging.info("Loading server settings from {}".format(self.path))
+
+        self.db = self.connect()
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS guild_settings (guild_id TEXT PRIMARY KEY, settings TEXT NOT NULL)"
+        )
+        self.db.commit()
+        self.cache.clear()
+        self.pending.clear()
+        self.dirty.clear()
+
+        # user_version is 0 until servers.json was migrated (or there was none)
+        # the write lock is taken first in case multiple processes share the database
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            if self.db.execute("PRAGMA user_version").fetchone()[0] == 0:
+                if self.migrate_from is not None and self.migrate_from.exists():
+                    json_store = JsonSettingsStore(self.migrate_from, self.defaults)
+                    json_store.load()
+
+                    self.db.executemany(
+                        "INSERT OR REPLACE INTO guild_settings VALUES (?, ?)",
+                        (
+                            (guild_id, json.dumps(overrides))
+                            for guild_id, overrides in json_store.copy_settings().items()
+                        )
+                    )
+
+                    logging.warning("Migrated {} server settings from {} to {}".format(
+                        len(json_store.settings),
+                        self.migrate_from,
+                        self.path
+                    ))
+
+                self.db.execute("PRAGMA user_version=1")
+
+            self.db.commit()
+
+        except:
+            self.db.rollback()
+            raise
+
+    def read(self, guild_id: str) -> dict:
+        """Return the latest stored settings of guild_id (None if it has none)"""
+
+        for changes in (self.pending, self.writing):
+            if guild_id in changes:
+                data = changes[guild_id]
+                return json.loads(data) if data is not None else None
+
+        row = self.db.execute(
+            "SELECT settings FROM guild_settings WHERE guild_id = ?",
+            (guild_id, )
+        ).fetchone()
+
+        return json.loads(row[0]) if row is not None else None
+
+    def get(self, guild_id: str) -> GuildSettings:
+        guild_settings = self.cache.get(guild_id)
+
+        if guild_settings is not None:
+            self.cache.move_to_end(guild_id)
+            return guild_settings
+
+        # An evicted guild that is still in use has the latest settings
+        guild_settings = self.evicted.pop(guild_id, None)
+        if guild_settings is None:
+            guild_settings = self.new_guild_settings(guild_id, self.read(guild_id))
+        self.cache[guild_id] = guild_settings
+
+        while len(self.cache) > self.cache_size:
+            self.evict()
+
+        return guild_settings
+
+    def evict(self) -> None:
+        """Remove the least recently used guild from the cache"""
+
+        guild_id, guild_settings = self.cache.popitem(last=False)
+
+        # It can still be changed by whoever holds it
+        self.evicted[guild_id] = guild_settings
+
+        if guild_id in self.dirty:
+            # Keep the changes until they are written
+            self.dirty.discard(guild_id)
+            self.pending[guild_id] = self.serialize(guild_settings)
+
+    def reset(self, guild_id: str) -> None:
+        self.cache.pop(guild_id, None)
+        self.evicted.pop(guild_id, None)
+        self.dirty.discard(guild_id)
+        self.pending[guild_id] = None
+
+    def serialize(self, guild_settings: GuildSettings) -> str:
+        """Return the overridden settings as JSON (None if there are none)"""
+
+        return json.dumps(guild_settings.overrides) if guild_settings.overrides else None
+
+    def pop_changes(self) -> dict:
+        """Return the changes to write (guild_id: JSON settings or None to delete)"""
+
+        for guild_id in self.dirty:
+            guild_settings = self.cache.get(guild_id)
+            if guild_settings is None:
+                guild_settings = self.evicted.get(guild_id)
+
+            if guild_settings is not None:
+                self.pending[guild_id] = self.serialize(guild_settings)
+
+        self.dirty.clear()
+        changes, self.pending = self.pending, dict()
+
+        return changes
+
+    def write_changes(self, changes: dict) -> None:
+        if self.writer_db is None:
+            self.writer_db = self.connect()
+
+        with self.writer_db:
+            self.writer_db.executemany(
+                "INSERT OR REPLACE INTO guild_settings VALUES (?, ?)",
+                ((guild_id, data) for guild_id, data in changes.items() if data is not None)
+            )
+            self.writer_db.executemany(
+                "DELETE FROM guild_settings WHERE guild_id = ?",
+                ((guild_id, ) for guild_id, data in changes.items() if data is None)
+            )
+
+    async def flush(self) -> None:
+        if not self.dirty and not self.pending:
+            return
+
+        loop = asyncio.get_event_loop()
+        changes = self.pop_changes()
+        self.writing = changes
+
+        try:
+            await loop.run_in_executor(self.executor, self.write_changes, changes)
+
+        except:
+            # Write the changes again on the next flush (newer ones first)
+            changes.update(self.pending)
+            self.pending = changes
+            raise
+
+        finally:
+            self.writing = dict()
+
+    def save(self) -> None:
+        logging.info("Saving server settings to {}".format(self.path))
+        changes = self.pop_changes()
+        self.executor.submit(self.write_changes, changes).result()
@@ -0,0 +1,148 @@
+from bisect import bisect_left
+
+"""
+    Marcel the Discord Bot
+    Copyright (C) 2019-2020  akrocynova
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# Upper bounds (in seconds) of the histogram buckets, from 1us to ~9min
+# with 4 buckets per power of two (each bucket is ~19% wider than the previous)
+latency_buckets = tuple(0.000001 * 2 ** (i / 4) for i in range(117))
+
+class LatencyHistogram:
+    """Fixed-size log-scale latency histogram"""
+
+    __slots__ = ("kind", "plugin_name", "name", "buckets", "count", "errors", "total", "max")
+
+    def __init__(self, kind: str, plugin_name: str, name: str) -> None:
+        self.kind = kind
+        self.plugin_name = plugin_name
+        self.name = name
+        self.buckets = [0] * (len(latency_buckets) + 1)
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float, weight: int = 1) -> None:
+        """Record a duration (in seconds) standing for weight calls"""
+
+        self.buckets[bisect_left(latency_buckets, seconds)] += weight
+        self.count += weight
+        self.total += seconds * weight
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, percent: float) -> float:
+        """Return the upper bound of the bucket holding the given percentile
+        (in seconds), values above the last bucket report the maximum"""
+
+        if self.count == 0:
+            return 0.0
+
+        rank = self.count * percent / 100
+        seen = 0
+
+        for i, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank and count > 0:
+                return latency_buckets[i] if i < len(latency_buckets) else self.max
+
+        return self.max
+
+    def clear(self) -> None:
+        """Reset all recorded durations"""
+
+        self.buckets = [0] * (len(latency_buckets) + 1)
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def summary(self) -> dict:
+        """Return a dict() summary of the histogram (durations in seconds)"""
+
+        return {
+            "kind": self.kind,
+            "plugin_name": self.plugin_name,
+            "name": self.name,
+            "count": self.count,
+            "errors": self.errors,
+            "total": self.total,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "max": self.max
+        }
+
+class LatencySampler:
+    """Picks the dispatches of an event that are timed, one out of
+    interval, starting with the first one"""
+
+    __slots__ = ("interval", "countdown")
+
+    def __init__(self, interval: int) -> None:
+        self.interval = interval
+        self.countdown = 1
+
+    def sample(self) -> int:
+        """Return the weight of the current dispatch if it is timed, otherwise 0"""
+
+        self.countdown -= 1
+        if self.countdown > 0:
+            return 0
+
+        self.countdown = self.interval
+        return self.interval
+
+class LatencyStats:
+    """Latency histograms of commands and event handlers
+    Durations are wall-clock times, including the time handlers spend
+    awaiting (blocking the event loop is reported by the loop watchdog)"""
+
+    def __init__(self) -> None:
+        self.histograms = dict()
+
+    def get(self, kind: str, plugin_name: str, name: str) -> LatencyHistogram:
+        """Return the histogram for the given command or event handler
+        Histograms are kept when plugins are reloaded"""
+
+        key = (kind, plugin_name, name)
+        histogram = self.histograms.get(key)
+
+        if histogram is None:
+            histogram = LatencyHistogram(kind, plugin_name, name)
+            self.histograms[key] = histogram
+
+        return histogram
+
+    def summary(self, kind: str = None) -> list:
+        """Return the summaries of all histograms (or of the given kind),
+        sorted by total time spent"""
+
+        summaries = [
+            histogram.summary() for histogram in self.histograms.values()
+            if histogram.count > 0 and (kind is None or histogram.kind == kind)
+        ]
+        summaries.sort(key=lambda x: x["total"], reverse=True)
+
+        return summaries
+
+    def clear(self) -> None:
+        """Reset all histograms"""
+
+        for histogram in self.histograms.values():
+            histogram.clear()
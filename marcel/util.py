@@ -1,4 +1,5 @@
 import discord
+import os
 
 """
     Marcel the Discord Bot
@@ -29,4 +30,24 @@ def embed_message(title: str, color: discord.Color, message: str = "") -> discor
 def escape_text(text: str) -> str:
     """Escape mentions and markdown in text"""
 
-    return discord.utils.escape_mentions(discord.utils.escape_markdown(text))
\ No newline at end of file
+    return discord.utils.escape_mentions(discord.utils.escape_markdown(text))
+
+def get_rss() -> int:
+    """Return the resident set size of the process in bytes
+    (its peak if the current one is not available, 0 if neither is)"""
+
+    try:
+        with open("/proc/self/statm", "r") as h:
+            return int(h.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+    except Exception:
+        pass
+
+    try:
+        import resource
+
+        # ru_maxrss is in KiB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    except Exception:
+        return 0
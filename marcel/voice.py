@@ -1,11 +1,16 @@
 from typing import Union
 from datetime import timedelta
+from collections import OrderedDict, deque
 from discord.ext import tasks
 from marcel.util import embed_message
+from marcel.mediastore import MediaStore
+import importlib
+import re
+import multiprocessing
 import asyncio
+import json
 import discord
 import time
-import youtube_dl
 import logging
 import random
 
@@ -27,6 +32,360 @@ import random
     along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
+# youtube_dl loads hundreds of extractors, it is imported on the first
+# media request
+youtube_dl = None
+
+# Extractor classes by allow-list (None for all the extractors)
+extractor_classes = dict()
+
+def import_youtube_dl():
+    """Import youtube_dl if it is not imported yet and return it"""
+
+    global youtube_dl
+
+    if youtube_dl is None:
+        youtube_dl = importlib.import_module("youtube_dl")
+
+    return youtube_dl
+
+def get_extractor_classes(names: tuple = None) -> tuple:
+    """Return the youtube_dl extractor classes in names (or all of them)
+    names: extractor names (e.g. "Youtube", "Soundcloud", "Generic")
+    The generic extractor matches any URL, it is always tried last"""
+
+    classes = extractor_classes.get(names)
+
+    if classes is None:
+        extractor = import_youtube_dl().extractor
+
+        if names is None:
+            classes = tuple(extractor.gen_extractor_classes())
+
+        else:
+            classes = list()
+            for name in names:
+                try:
+                    classes.append(extractor.get_info_extractor(name))
+
+                except KeyError:
+                    logging.error("Unknown youtube-dl extractor: {}".format(name))
+
+            classes.sort(key=lambda x: x.ie_key() == "Generic")
+            classes = tuple(classes)
+
+        extractor_classes[names] = classes
+
+    return classes
+
+class YoutubeDLPool:
+    def __init__(self, max_idle: int = 4) -> None:
+        """Process-wide pool of YoutubeDL instances
+        Instances are reused by requests with the same options, which keeps
+        their extractors (and the players they cached) between requests
+        max_idle: maximum number of idle instances kept per option set"""
+
+        self.max_idle = max_idle
+        self.idle = dict()
+        self.created = 0
+
+    def get_key(self, options: dict, extractors: tuple = None) -> tuple:
+        """Return the pool key of an option set"""
+
+        return (tuple(sorted(options.items())), extractors)
+
+    def acquire(self, key: tuple) -> object:
+        """Return an idle YoutubeDL instance for key, or None"""
+
+        # Extraction threads share the pool
+        try:
+            return self.idle[key].pop()
+
+        except (KeyError, IndexError):
+            return None
+
+    def create(self, key: tuple) -> object:
+        """Return a new YoutubeDL instance for key (blocking)"""
+
+        options, extractors = key
+
+        ytdl = import_youtube_dl().YoutubeDL(params=dict(options), auto_init=False)
+        for extractor in get_extractor_classes(extractors):
+            ytdl.add_info_extractor(extractor)
+
+        self.created += 1
+
+        return ytdl
+
+    def release(self, key: tuple, ytdl: object) -> None:
+        """Return an instance to the pool once its request completed"""
+
+        instances = self.idle.setdefault(key, list())
+
+        if len(instances) < self.max_idle:
+            instances.append(ytdl)
+
+    def clear(self) -> None:
+        """Drop all the idle instances"""
+
+        self.idle.clear()
+
+ytdl_pool = YoutubeDLPool()
+
+# Entry fields parsed by MarcelMediaPlayer.ytdl_entry_to_playerinfo
+entry_fields = ("_type", "extractor_key", "title", "uploader", "thumbnail", "duration", "webpage_url", "url")
+
+# youtube-dl errors caused by the cached player code of YouTube (signature
+# functions), other errors do not clear the cache
+player_error_re = re.compile(r"signature|JS function|identify player", re.IGNORECASE)
+
+# Expiry timestamp of playback URLs (e.g. googlevideo.com ?expire=... or /expire/...)
+expire_re = re.compile(r"[?&/]expire[=/](\d{10,})")
+
+def trim_info(info: dict) -> dict:
+    """Return info (or its entries) with only the entry_fields"""
+
+    if "entries" in info:
+        return dict(entries=[{field: x.get(field) for field in entry_fields} for x in info["entries"]])
+
+    return {field: info.get(field) for field in entry_fields}
+
+def extract_info(key: tuple, request: str, trim: bool = False) -> dict:
+    """Extract information about request with a YoutubeDL instance of
+    ytdl_pool (blocking)
+    key: ytdl_pool key of the options and extractors
+    trim: return the entry_fields only"""
+
+    ytdl = ytdl_pool.acquire(key) or ytdl_pool.create(key)
+
+    try:
+        info = ytdl.extract_info(url=request, download=False)
+
+    except Exception as e:
+        if player_error_re.search(str(e)):
+            # A stale cached player signature can break the extractions,
+            # start again from an empty cache. The extractors of this
+            # instance keep the players in memory, it is not reused.
+            try:
+                ytdl.cache.remove()
+
+            except Exception as cache_error:
+                logging.error("Unable to clear youtube-dl cache: {}".format(cache_error))
+
+        else:
+            ytdl_pool.release(key, ytdl)
+
+        raise
+
+    ytdl_pool.release(key, ytdl)
+
+    return trim_info(info) if trim else info
+
+def process_extract_info(key: tuple, request: str, trim: bool = False) -> dict:
+    """extract_info() for the extraction processes, youtube-dl exceptions can
+    hold unpicklable objects"""
+
+    try:
+        return extract_info(key, request, trim)
+
+    except Exception as e:
+        raise Exception(str(e)) from None
+
+class ExtractionPool:
+    def __init__(self, processes: int = 2, max_jobs: int = 100) -> None:
+        """Pool of processes running the youtube-dl extractions, their
+        parsing then does not hold the GIL of the event loop and of the
+        audio threads
+        processes: number of extraction processes
+        max_jobs: number of extractions after which a process is replaced,
+                  this bounds the memory youtube-dl accumulates
+
+        Processes are started on the first extraction."""
+
+        self.processes = processes
+        self.max_jobs = max_jobs
+        self.pool = None
+
+    def run(self, func, *args) -> asyncio.Future:
+        """Run func(*args) in an extraction process and return its future
+        func and args must be picklable"""
+
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+
+        if self.pool is None:
+            self.pool = multiprocessing.get_context("spawn").Pool(
+                self.processes,
+                maxtasksperchild=self.max_jobs
+            )
+
+        def set_result(result) -> None:
+            if not future.done():
+                future.set_result(result)
+
+        def set_exception(e: BaseException) -> None:
+            if not future.done():
+                future.set_exception(e)
+
+        self.pool.apply_async(
+            func,
+            args,
+            callback=lambda result: loop.call_soon_threadsafe(set_result, result),
+            error_callback=lambda e: loop.call_soon_threadsafe(set_exception, e)
+        )
+
+        return future
+
+    def stop(self) -> None:
+        """Terminate the extraction processes"""
+
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool = None
+
+# Extraction priorities, lower values run first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+PRIORITY_LOOKAHEAD = 2
+priority_names = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_BACKGROUND: "background",
+    PRIORITY_LOOKAHEAD: "lookahead"
+}
+
+class ExtractionCancelled(Exception):
+    pass
+
+class ExtractionJob:
+    def __init__(self, key: tuple, priority: int, func) -> None:
+        """Extraction waited for by one or more requests"""
+
+        self.key = key
+        self.priority = priority
+        self.func = func
+        self.waiters = list()
+        self.task = None
+
+class ExtractionScheduler:
+    def __init__(self, max_running: int = 4) -> None:
+        """Run extractions by priority, at most max_running at once
+        Identical concurrent requests wait for the same extraction and the
+        requests of an owner (a media player) can be cancelled together"""
+
+        self.max_running = max_running
+        self.jobs = dict()
+        self.queues = {priority: deque() for priority in sorted(priority_names)}
+        self.running = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.abandoned = 0
+
+    def queue_depth(self) -> dict:
+        """Return the number of queued extractions by priority name"""
+
+        return {priority_names[priority]: len(queue) for priority, queue in self.queues.items()}
+
+    async def run(self, key: tuple, owner: object, priority: int, func) -> object:
+        """Return the result of func(), a coroutine function that is run
+        once for all the concurrent requests with the same key
+        owner: object the request belongs to (see cancel())
+        Raises ExtractionCancelled if the request is cancelled"""
+
+        job = self.jobs.get(key)
+
+        if job is None:
+            job = ExtractionJob(key, priority, func)
+            self.jobs[key] = job
+            self.queues[priority].append(job)
+
+        else:
+            self.coalesced += 1
+
+            if job.task is None and priority < job.priority:
+                self.queues[job.priority].remove(job)
+                job.priority = priority
+                self.queues[priority].append(job)
+
+        waiter = asyncio.get_event_loop().create_future()
+        job.waiters.append((owner, priority, waiter))
+        self.dispatch()
+
+        try:
+            return await waiter
+
+        finally:
+            # The extraction keeps running for the other requests if this
+            # one is cancelled
+            self.remove_waiters(job, lambda x: x[2] is waiter)
+
+    def remove_waiters(self, job: ExtractionJob, predicate) -> None:
+        """Remove the waiters of job matching predicate, a queued job
+        nobody waits for anymore is dropped"""
+
+        job.waiters = [x for x in job.waiters if not predicate(x)]
+
+        if job.waiters or self.jobs.get(job.key) is not job:
+            return
+
+        if job.task is None:
+            self.queues[job.priority].remove(job)
+            del self.jobs[job.key]
+            self.dropped += 1
+
+    def cancel(self, owner: object, priorities: tuple = None) -> None:
+        """Cancel the requests of owner (only those made with priorities if
+        set), they raise ExtractionCancelled
+        Queued extractions nobody else waits for are dropped, running ones
+        cannot be interrupted and complete in the background"""
+
+        for job in list(self.jobs.values()):
+            cancelled = [
+                x for x in job.waiters
+                if x[0] is owner and (priorities is None or x[1] in priorities)
+            ]
+
+            for _, _, waiter in cancelled:
+                if not waiter.done():
+                    waiter.set_exception(ExtractionCancelled())
+
+            if cancelled:
+                self.remove_waiters(job, lambda x: x in cancelled)
+
+                if job.task is not None and not job.waiters:
+                    self.abandoned += 1
+
+    def dispatch(self) -> None:
+        """Start the queued extractions with the highest priorities"""
+
+        while self.running < self.max_running:
+            queue = next((x for x in self.queues.values() if x), None)
+            if queue is None:
+                return
+
+            job = queue.popleft()
+            job.task = asyncio.ensure_future(job.func())
+            job.task.add_done_callback(lambda task, job=job: self.finish(job, task))
+            self.running += 1
+
+    def finish(self, job: ExtractionJob, task: asyncio.Task) -> None:
+        self.running -= 1
+
+        if self.jobs.get(job.key) is job:
+            del self.jobs[job.key]
+
+        for _, _, waiter in job.waiters:
+            if waiter.done():
+                continue
+
+            if task.cancelled():
+                waiter.cancel()
+            elif task.exception() is not None:
+                waiter.set_exception(task.exception())
+            else:
+                waiter.set_result(task.result())
+
+        self.dispatch()
+
 class PlayerInfo:
     def __init__(
         self,
@@ -38,8 +397,11 @@ class PlayerInfo:
         playback_url: str = None,
         found: bool = False,
         from_ytdl: bool = False,
-        error: str = None) -> None:
-        """Media player information"""
+        error: str = None,
+        playback_expires: float = None) -> None:
+        """Media player information
+        playback_expires: time (time.time()) at which playback_url expires,
+                          None if it is unknown or is not a playback URL"""
         self.title = title
         self.author = author
         self.thumbnail = thumbnail
@@ -68,6 +430,7 @@ class PlayerInfo:
         # The Media Player will fetch the regular URL using youtube-dl right before playing it
         # to fix an issue where the extracted playback URLs expire after some time
         self.from_ytdl = from_ytdl
+        self.playback_expires = playback_expires
 
     def clear(self) -> None:
         self.title = None
@@ -77,6 +440,15 @@ class PlayerInfo:
         self.url = None
         self.playback_url = None
         self.found = False
+        self.playback_expires = None
+
+    def playback_valid(self, margin: float = 0.0) -> bool:
+        """Return True if playback_url is known to remain valid for margin seconds"""
+
+        if self.playback_url is None or self.playback_expires is None:
+            return False
+
+        return self.playback_expires - margin > time.time()
 
     def is_http(self) -> bool:
         if self.playback_url:
@@ -94,7 +466,9 @@ class PlayerInfo:
             url=self.url,
             playback_url=self.playback_url,
             found=self.found,
-            from_ytdl=self.from_ytdl
+            from_ytdl=self.from_ytdl,
+            error=self.error,
+            playback_expires=self.playback_expires
         )
 
     def get_embed(self, title: str, color: discord.Color, show_duration: bool = True) -> discord.Embed:
@@ -116,7 +490,170 @@ class PlayerInfo:
 
         return embed
 
+class MediaCache:
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        metadata_ttl: float = 21600.0,
+        playback_ttl: float = 1800.0,
+        store: MediaStore = None) -> None:
+        """LRU cache of ytdl_fetch results
+        max_entries: maximum number of cached requests
+        metadata_ttl: time (in seconds) the media information is kept
+        playback_ttl: time (in seconds) the playback URLs are valid for when
+                      their expiry is unknown, they expire long before the
+                      rest of the information
+        store: MediaStore keeping the media information across restarts
+               (playback URLs are not stored)"""
+
+        self.max_entries = max_entries
+        self.metadata_ttl = metadata_ttl
+        self.playback_ttl = playback_ttl
+        self.store = store
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def get_key(request: str, *options) -> tuple:
+        """Return the cache key of a request made with options
+        Searches are case insensitive, URLs are not"""
+
+        request = " ".join(request.split())
+        if not "://" in request:
+            request = request.lower()
+
+        return (request, ) + options
+
+    def get(
+        self,
+        key: tuple,
+        with_playback_url: bool = False,
+        playback_margin: float = 0.0) -> Union[PlayerInfo, list]:
+        """Return a copy of the cached result for key, or None
+        with_playback_url: only return results with valid playback URLs,
+                           otherwise expired playback URLs are None
+        playback_margin: time (in seconds) the playback URLs must remain
+                         valid for with with_playback_url"""
+
+        entry = self.entries.get(key)
+        now = time.monotonic()
+
+        if entry is not None and entry["expires"] <= now:
+            del self.entries[key]
+            entry = None
+
+        if entry is None or (with_playback_url and entry["playback_expires"] <= now + playback_margin):
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+
+        playback_urls = entry["playback_urls"] if entry["playback_expires"] > now else None
+        pinfos = list()
+
+        for i, metadata in enumerate(entry["pinfos"]):
+            pinfo = metadata.copy()
+            if playback_urls:
+                pinfo.playback_url, pinfo.playback_expires = playback_urls[i]
+            pinfos.append(pinfo)
+
+        return pinfos if entry["playlist"] else pinfos[0]
+
+    async def load(self, key: tuple) -> Union[PlayerInfo, list]:
+        """Return the stored result for key and cache it, or None
+        Its playback URLs are None, it must be fetched again before playing"""
+
+        if self.store is None:
+            return None
+
+        stored = await self.store.get(json.dumps(key))
+        if stored is None:
+            return None
+
+        playlist, medias = stored
+        pinfos = [
+            PlayerInfo(
+                title=x["title"],
+                author=x["author"],
+                thumbnail=x["thumbnail"],
+                duration=x["duration"],
+                url=x["url"],
+                found=True,
+                from_ytdl=True
+            )
+            for x in medias
+        ]
+        result = pinfos if playlist else pinfos[0]
+        self.put(key, result, stored=True)
+
+        return result
+
+    def put(self, key: tuple, result: Union[PlayerInfo, list], stored: bool = False) -> None:
+        """Cache result for key, results without media are not cached
+        stored: result was loaded from the store, its playback URLs expired"""
+
+        pinfos = result if isinstance(result, list) else [result]
+        if len(pinfos) == 0 or not all(x.found for x in pinfos):
+            return
+
+        if self.store is not None and not stored and all(x.url for x in pinfos):
+            self.store.put(json.dumps(key), isinstance(result, list), [
+                {
+                    "url": x.url,
+                    "title": x.title,
+                    "author": x.author,
+                    "thumbnail": x.thumbnail,
+                    "duration": x.duration
+                }
+                for x in pinfos
+            ])
+
+        metadata = list()
+        for pinfo in pinfos:
+            pinfo = pinfo.copy()
+            pinfo.playback_url = None
+            pinfo.playback_expires = None
+            metadata.append(pinfo)
+
+        now = time.monotonic()
+
+        if stored:
+            playback_expires = now
+        elif all(x.playback_expires is not None for x in pinfos):
+            playback_expires = now + min(x.playback_expires for x in pinfos) - time.time()
+        else:
+            playback_expires = now + self.playback_ttl
+
+        self.entries[key] = {
+            "pinfos": metadata,
+            "playback_urls": [(x.playback_url, x.playback_expires) for x in pinfos],
+            "playlist": isinstance(result, list),
+            "expires": now + self.metadata_ttl,
+            "playback_expires": playback_expires
+        }
+        self.entries.move_to_end(key)
+
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Remove all the cached results"""
+
+        self.entries.clear()
+
 class MarcelMediaPlayer:
+    # Number of ytdl_fetch calls in progress (all guilds)
+    ytdl_inflight = 0
+
+    # Number of extractions avoided because a playback URL was still valid
+    ytdl_refreshes_avoided = 0
+
+    # Extractions of all the guilds, concurrent identical requests wait
+    # for the same one
+    ytdl_scheduler = ExtractionScheduler()
+
     def __init__(
         self,
         guild: discord.Guild,
@@ -124,7 +661,13 @@ class MarcelMediaPlayer:
         volume_limit: float = 1.25,
         player_queue_limit: int = 20,
         duration_limit: int = 1800,
-        idle_limit: int = 0) -> None:
+        idle_limit: int = 0,
+        extractors: list = None,
+        ytdl_cache_dir: Union[str, bool] = None,
+        media_cache: MediaCache = None,
+        extraction_pool: ExtractionPool = None,
+        lookahead: int = 2,
+        playback_ttls: dict = None) -> None:
         """Marcel media player
         guild: discord.Guild() to which the media player belongs to
         volume: volume value (1.0 represents 100%)
@@ -134,6 +677,18 @@ class MarcelMediaPlayer:
         idle_limit: time (in seconds) of inactivity after which the bot will
                     automatically disconnect from the voice channel
                     (0 to disable)
+        extractors: names of the youtube-dl extractors that requests are
+                    matched against (None for all of them)
+        ytdl_cache_dir: youtube-dl cache folder (None for youtube-dl's default,
+                        False to disable the cache)
+        media_cache: MediaCache shared by the media players (None to disable)
+        extraction_pool: ExtractionPool running the extractions (None to run
+                         them in the event loop's thread pool)
+        lookahead: number of upcoming medias of the player queue that are
+                   resolved in advance (0 to resolve them when they play)
+        playback_ttls: time (in seconds) the playback URLs of an extractor
+                       (e.g. "Soundcloud") are valid for when they do not
+                       contain their expiry
         """
         self.guild = guild
         self.player_volume = volume
@@ -141,6 +696,13 @@ class MarcelMediaPlayer:
         self.player_queue_limit = player_queue_limit
         self.duration_limit = duration_limit
         self.idle_limit = idle_limit
+        self.extractors = tuple(extractors) if extractors is not None else None
+        self.ytdl_cache_dir = ytdl_cache_dir
+        self.media_cache = media_cache
+        self.extraction_pool = extraction_pool
+        self.lookahead = lookahead
+        self.playback_ttl = media_cache.playback_ttl if media_cache is not None else 1800.0
+        self.playback_ttls = playback_ttls if playback_ttls is not None else dict()
 
         self.voice_client = None
         self.autoplay = False
@@ -150,6 +712,13 @@ class MarcelMediaPlayer:
         self.last_played = None
         self.player_queue = list()
 
+        # Upcoming medias resolved with fresh playback URLs (by URL)
+        self.resolved = dict()
+        self.resolver_task = None
+        self.resolver_wakeup = asyncio.Event()
+        # Playback URLs are refreshed this long (in seconds) before they expire
+        self.resolve_margin = min(60.0, self.playback_ttl / 4)
+
         self.loop = asyncio.get_event_loop()
         self.connect_timeout = 10.0
         self.last_active = time.time()
@@ -169,10 +738,11 @@ class MarcelMediaPlayer:
                 await self.leave_voice_channel(reason="inactive for a while")
                 return
 
-            for member in self.voice_client.channel.members:
-                if member == self.guild.me:
+            # Voice states are kept even when the members are not cached
+            for member_id, voice_state in self.voice_client.channel.voice_states.items():
+                if member_id == self.guild.me.id:
                     continue
-                if not member.voice.afk:
+                if not voice_state.afk:
                     self.last_not_alone = time.time()
                     return
 
@@ -222,6 +792,20 @@ class MarcelMediaPlayer:
 
         return self.voice_client.is_paused() if self.is_in_voice_channel() else False
 
+    def get_playback_expiry(self, entry: dict) -> float:
+        """Return the time (time.time()) at which the playback URL of a
+        Youtube-DL entry expires, or None"""
+
+        # Flat playlist entries link to the media instead of playing it
+        if not entry.get("url") or entry.get("_type") in ("url", "url_transparent"):
+            return None
+
+        match = expire_re.search(entry["url"])
+        if match:
+            return float(match.group(1))
+
+        return time.time() + self.playback_ttls.get(entry.get("extractor_key"), self.playback_ttl)
+
     def ytdl_entry_to_playerinfo(self, entry: dict) -> PlayerInfo:
         """Parse Youtube-DL entry into PlayerInfo"""
 
@@ -233,7 +817,8 @@ class MarcelMediaPlayer:
             url=entry.get("webpage_url"),
             playback_url=entry.get("url"),
             found=True if entry.get("url") else False,
-            from_ytdl=True
+            from_ytdl=True,
+            playback_expires=self.get_playback_expiry(entry)
         )
 
     async def ytdl_fetch(
@@ -241,18 +826,86 @@ class MarcelMediaPlayer:
         request: str,
         as_playerinfo: bool = False,
         with_playlists: bool = False,
-        playlistend: int = 0) -> Union[PlayerInfo, list, dict]:
-        """Fetch information about a given request using youtube-dl
+        playlistend: int = 0,
+        with_playback_url: bool = False,
+        playback_margin: float = 0.0,
+        priority: int = PRIORITY_INTERACTIVE) -> Union[PlayerInfo, list, dict]:
+        """Fetch information about a given request using youtube-dl, or from
+        the media cache
         request: can either be a link or a text search
+        with_playback_url: the result must have a valid playback URL, cached
+                           results may have expired ones otherwise
+        playback_margin: time (in seconds) a cached playback URL must remain
+                         valid for
+        priority: PRIORITY_INTERACTIVE for the requests a user waits for,
+                  PRIORITY_BACKGROUND or PRIORITY_LOOKAHEAD for the others
+                  (they wait for the user requests)
         Returns either a list or a PlayerInfo if as_playerinfo is True"""
 
+        playlistend = self.player_queue_limit if playlistend <= 0 else playlistend
+        cache_key = MediaCache.get_key(request, with_playlists, playlistend, self.extractors)
+        use_cache = as_playerinfo and self.media_cache is not None
+
+        if use_cache:
+            result = self.media_cache.get(
+                cache_key,
+                with_playback_url=with_playback_url,
+                playback_margin=playback_margin
+            )
+
+            if result is None and not with_playback_url:
+                result = await self.media_cache.load(cache_key)
+
+            if result is not None:
+                return result
+
+        async def extract():
+            result = await self.ytdl_extract(request, as_playerinfo, with_playlists, playlistend)
+            if use_cache:
+                self.media_cache.put(cache_key, result)
+
+            return result
+
+        try:
+            result = await MarcelMediaPlayer.ytdl_scheduler.run(
+                cache_key + (as_playerinfo, ),
+                self,
+                priority,
+                extract
+            )
+
+        except ExtractionCancelled:
+            logging.info("ytdl_fetch cancelled for guild: {}: {}".format(
+                self.guild.id,
+                request
+            ))
+            return PlayerInfo(error="Request was cancelled") if as_playerinfo else dict()
+
+        # Each request gets its own PlayerInfo objects
+        if isinstance(result, PlayerInfo):
+            return result.copy()
+
+        elif isinstance(result, list):
+            return [x.copy() if isinstance(x, PlayerInfo) else x for x in result]
+
+        return result
+
+    async def ytdl_extract(
+        self,
+        request: str,
+        as_playerinfo: bool,
+        with_playlists: bool,
+        playlistend: int) -> Union[PlayerInfo, list, dict]:
+        """Extract information about a given request using youtube-dl"""
+
+        MarcelMediaPlayer.ytdl_inflight += 1
         try:
             ytdl_opts = {
                 "format": "bestaudio/best",
                 "outtmpl": "%(extractor)s-%(id)s-%(title)s.%(ext)s",
                 "simulate": True,
                 "skip_download": True,
-                "playlistend": self.player_queue_limit if playlistend <= 0 else playlistend,
+                "playlistend": playlistend,
                 "flat_playlist": True,
                 "restrictfilenames": True,
                 "nocheckcertificate": True,
@@ -270,34 +923,34 @@ class MarcelMediaPlayer:
 
             error = "No results for"
 
-            with youtube_dl.YoutubeDL(params=ytdl_opts) as ytdl:
-                await self.loop.run_in_executor(None, ytdl.cache.remove)
+            if self.ytdl_cache_dir is not None:
+                ytdl_opts["cachedir"] = self.ytdl_cache_dir
 
-                try:
-                    info = await asyncio.wait_for(
-                        self.loop.run_in_executor(
-                            None,
-                            lambda: ytdl.extract_info(
-                                url=request,
-                                download=False
-                        )),
-                        timeout=300.0
-                    )
+            key = ytdl_pool.get_key(ytdl_opts, self.extractors)
 
-                except asyncio.TimeoutError:
-                    logging.error("ytdl_fetch timed out for guild: {}: {}".format(
-                        self.guild.id,
-                        request
-                    ))
+            if self.extraction_pool is not None:
+                # Only the entry fields are sent back for PlayerInfos
+                extraction = self.extraction_pool.run(process_extract_info, key, request, as_playerinfo)
+            else:
+                extraction = self.loop.run_in_executor(None, extract_info, key, request)
 
-                    info = dict(entries=list())
-                    error = "Request took too long (timed out)"
+            try:
+                info = await asyncio.wait_for(extraction, timeout=300.0)
 
-                except Exception as e:
-                    logging.error("ytdl_fetch: {}".format(e))
+            except asyncio.TimeoutError:
+                logging.error("ytdl_fetch timed out for guild: {}: {}".format(
+                    self.guild.id,
+                    request
+                ))
 
-                    info = dict(entries=list())
-                    error = str(e)[6:].strip()
+                info = dict(entries=list())
+                error = "Request took too long (timed out)"
+
+            except Exception as e:
+                logging.error("ytdl_fetch: {}".format(e))
+
+                info = dict(entries=list())
+                error = str(e)[6:].strip()
 
             if as_playerinfo:
                 entries = info.get("entries", [info])
@@ -316,6 +969,104 @@ class MarcelMediaPlayer:
             logging.error("ytdl_fetch: {}".format(e))
             return PlayerInfo(error=str(e)[6:].strip()) if as_playerinfo else dict()
 
+        finally:
+            MarcelMediaPlayer.ytdl_inflight -= 1
+
+    def resolve_upcoming(self) -> None:
+        """Resolve the upcoming medias of the player queue in the background,
+        this is called when the player queue changes"""
+
+        if self.lookahead <= 0:
+            return
+
+        self.resolver_wakeup.set()
+
+        if self.resolver_task is None or self.resolver_task.done():
+            self.resolver_task = self.loop.create_task(self.run_resolver())
+
+    def stop_resolver(self) -> None:
+        """Stop resolving the upcoming medias and forget the resolved ones"""
+
+        if self.resolver_task is not None:
+            self.resolver_task.cancel()
+            self.resolver_task = None
+
+        self.resolved.clear()
+
+    async def run_resolver(self) -> None:
+        while True:
+            self.resolver_wakeup.clear()
+
+            try:
+                next_refresh = await self.resolve_next()
+
+            except Exception as e:
+                logging.error("Unable to resolve upcoming medias for guild: {}: {}".format(
+                    self.guild.id,
+                    e
+                ))
+                next_refresh = None
+
+            if self.resolver_wakeup.is_set():
+                continue
+
+            if next_refresh is None:
+                # Nothing to refresh until the player queue changes
+                return
+
+            try:
+                await asyncio.wait_for(
+                    self.resolver_wakeup.wait(),
+                    timeout=max(next_refresh - time.time(), 1.0)
+                )
+
+            except asyncio.TimeoutError:
+                pass
+
+    async def resolve_next(self) -> float:
+        """Resolve the next lookahead medias of the player queue that are not
+        resolved yet or whose playback URLs are about to expire
+        Returns the time (time.time()) of the next refresh, or None"""
+
+        upcoming = [x for x in self.player_queue[:self.lookahead] if x.from_ytdl and x.url]
+        upcoming_urls = set(x.url for x in upcoming)
+
+        for url in list(self.resolved):
+            if not url in upcoming_urls:
+                del self.resolved[url]
+
+        next_refresh = None
+        for pinfo in upcoming:
+            resolved = self.resolved.get(pinfo.url)
+
+            if resolved is None and pinfo.playback_valid(self.resolve_margin):
+                # The queued media is still playable
+                MarcelMediaPlayer.ytdl_refreshes_avoided += 1
+                resolved = pinfo
+                self.resolved[pinfo.url] = resolved
+
+            if resolved is None or not resolved.playback_valid(self.resolve_margin):
+                resolved = await self.ytdl_fetch(
+                    pinfo.url,
+                    as_playerinfo=True,
+                    with_playback_url=True,
+                    playback_margin=self.resolve_margin,
+                    priority=PRIORITY_LOOKAHEAD
+                )
+
+                if not resolved.found or resolved.playback_expires is None:
+                    # It will be fetched when it plays
+                    self.resolved.pop(pinfo.url, None)
+                    continue
+
+                self.resolved[pinfo.url] = resolved
+
+            refresh = resolved.playback_expires - self.resolve_margin
+            if next_refresh is None or refresh < next_refresh:
+                next_refresh = refresh
+
+        return next_refresh
+
     async def send_nothing_playing(self) -> None:
         """Send a nothing is playing message to the previous channel"""
 
@@ -463,6 +1214,10 @@ class MarcelMediaPlayer:
 
         self.set_previous_channel(channel)
 
+        # Pending media requests are of no use anymore
+        self.stop_resolver()
+        MarcelMediaPlayer.ytdl_scheduler.cancel(self)
+
         try:
             if self.is_in_voice_channel():
                 if self.is_media_playing() or self.is_media_paused():
@@ -570,11 +1325,13 @@ class MarcelMediaPlayer:
                     shuffle=False
                 )
 
-            else:
+            elif pinfo.playback_valid(self.resolve_margin):
                 # If there is only one result, don't refresh the playback URLs
                 # We don't disable the refresh if there are multiple results
                 # because grabbing multiple results can take some time and the
                 # playback URL can expire
+                # Cached results may only hold the media information, their
+                # playback URLs are refreshed
                 fetch_before_play = False
 
         if not self.is_in_voice_channel() and member:
@@ -621,17 +1378,35 @@ class MarcelMediaPlayer:
                 self.autoplay = False
                 self.voice_client.stop()
 
-            if fetch_before_play:
+            resolved = self.resolved.pop(pinfo.url, None) if fetch_before_play else None
+
+            if resolved is not None and resolved.playback_valid():
+                # Resolved in advance by the look-ahead resolver
+                pinfo = resolved
+
+            elif fetch_before_play and pinfo.playback_valid(self.resolve_margin):
+                # The playback URL does not expire before long
+                MarcelMediaPlayer.ytdl_refreshes_avoided += 1
+
+            elif fetch_before_play:
                 async with self.previous_channel.typing():
-                    # Always refresh the playback URL when fetched from youtube-dl to prevent expired URLs
+                    # Refresh the playback URL when fetched from youtube-dl to prevent expired URLs,
+                    # unless the cached one is still valid
+                    # The media is starting, the user waits for it
                     pinfo = await self.ytdl_fetch(
                         pinfo.url,
-                        as_playerinfo=True
+                        as_playerinfo=True,
+                        with_playback_url=True,
+                        playback_margin=self.resolve_margin,
+                        priority=PRIORITY_INTERACTIVE
                     )
 
                     if not pinfo.found:
                         raise Exception(pinfo.error)
 
+            if not pinfo.playback_url:
+                raise Exception("No playback URL for this media")
+
             self.player_info = pinfo.copy()
             self.last_played = self.player_info.copy()
 
@@ -708,6 +1483,7 @@ class MarcelMediaPlayer:
                 respect_duration_limit=respect_duration_limit
             )
             del self.player_queue[0]
+            self.resolve_upcoming()
 
     async def stop(self, channel: discord.TextChannel = None, silent: bool = False) -> None:
         """Stop any currently playing media and disable autoplay"""
@@ -715,6 +1491,9 @@ class MarcelMediaPlayer:
         self.set_previous_channel(channel)
 
         self.autoplay = False
+        self.stop_resolver()
+        MarcelMediaPlayer.ytdl_scheduler.cancel(self)
+
         if self.is_media_playing() or self.is_media_paused():
             self.voice_client.stop()
 
@@ -887,6 +1666,8 @@ class MarcelMediaPlayer:
                     )
                 break
 
+        self.resolve_upcoming()
+
         if added > 19:
             remaining = added - 19
             playlist_embed.add_field(
@@ -916,6 +1697,10 @@ class MarcelMediaPlayer:
 
         self.player_queue.clear()
 
+        # Requests for the queued medias, the media starting now is kept
+        self.stop_resolver()
+        MarcelMediaPlayer.ytdl_scheduler.cancel(self, (PRIORITY_BACKGROUND, PRIORITY_LOOKAHEAD))
+
         if not silent:
             await self.previous_channel.send(
                 embed=embed_message(
@@ -940,6 +1725,7 @@ class MarcelMediaPlayer:
             return
 
         random.shuffle(self.player_queue)
+        self.resolve_upcoming()
 
         if not silent:
             await self.previous_channel.send(
@@ -960,6 +1746,8 @@ class MarcelMediaPlayer:
         while len(self.player_queue) > self.player_queue_limit:
             self.player_queue.pop()
 
+        self.resolve_upcoming()
+
     def set_volume(self, volume: float) -> None:
         """Set player volume"""
 
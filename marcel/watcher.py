@@ -0,0 +1,193 @@
+from pathlib import Path
+import ctypes
+import ctypes.util
+import asyncio
+import logging
+import struct
+import os
+
+"""
+    Marcel the Discord Bot
+    Copyright (C) 2019-2020  akrocynova
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# inotify(7) constants
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+inotify_event = struct.Struct("iIII")
+
+class PluginWatcher:
+    def __init__(self, marcel, path: Path, interval: float = 1.0, delay: float = 0.5) -> None:
+        """Watch the plugins folder and hot reload the plugins that change
+        marcel: Marcel instance
+        path: plugins folder
+        interval: polling interval (in seconds) when inotify is not available
+        delay: time (in seconds) without changes before reloading, editors
+               often write a file several times"""
+
+        self.marcel = marcel
+        self.path = path
+        self.interval = interval
+        self.delay = delay
+        self.loop = None
+        self.fd = None
+        self.task = None
+        self.handle = None
+        self.reload_tasks = set()
+        self.changed = set()
+        self.lock = asyncio.Lock()
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Start watching the plugins folder"""
+
+        self.loop = loop
+
+        try:
+            self.fd = self.inotify_init()
+            self.loop.add_reader(self.fd, self.read_events)
+            logging.info("Watching plugins folder with inotify: {}".format(self.path))
+
+        except Exception as e:
+            logging.info("inotify is not available ({}), polling plugins folder: {}".format(e, self.path))
+            self.task = self.loop.create_task(self.poll())
+
+    def stop(self) -> None:
+        """Stop watching the plugins folder"""
+
+        if self.fd is not None:
+            self.loop.remove_reader(self.fd)
+            os.close(self.fd)
+            self.fd = None
+
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+        if self.handle is not None:
+            self.handle.cancel()
+            self.handle = None
+
+        for task in self.reload_tasks:
+            task.cancel()
+        self.reload_tasks.clear()
+
+    def inotify_init(self) -> int:
+        """Return an inotify file descriptor watching the plugins folder"""
+
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+
+        if libc.inotify_add_watch(
+            fd,
+            os.fsencode(str(self.path)),
+            IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE) < 0:
+            errno = ctypes.get_errno()
+            os.close(fd)
+            raise OSError(errno, os.strerror(errno))
+
+        return fd
+
+    def read_events(self) -> None:
+        try:
+            data = os.read(self.fd, 65536)
+
+        except BlockingIOError:
+            return
+
+        offset = 0
+        while offset + inotify_event.size <= len(data):
+            _, mask, _, length = inotify_event.unpack_from(data, offset)
+            offset += inotify_event.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                # Events were lost, reload everything
+                self.changed.update(self.path.iterdir())
+                self.changed.update(plugin["filepath"] for plugin in self.marcel.plugins.values())
+
+            elif name.lower().endswith(".py"):
+                self.changed.add(self.path.joinpath(name))
+
+        self.schedule()
+
+    def snapshot(self) -> dict:
+        """Return the modification time and size of the plugin files"""
+
+        files = dict()
+
+        for filepath in self.path.iterdir():
+            if filepath.name.lower().endswith(".py"):
+                try:
+                    st = filepath.stat()
+                    files[filepath] = (st.st_mtime_ns, st.st_size)
+
+                except FileNotFoundError:
+                    pass
+
+        return files
+
+    async def poll(self) -> None:
+        files = self.snapshot()
+
+        while True:
+            await asyncio.sleep(self.interval)
+
+            try:
+                current = self.snapshot()
+
+            except Exception as e:
+                logging.error("Unable to scan plugins folder: {}: {}".format(self.path, e))
+                continue
+
+            for filepath in files.keys() | current.keys():
+                if files.get(filepath) != current.get(filepath):
+                    self.changed.add(filepath)
+
+            files = current
+            if self.changed:
+                self.schedule()
+
+    def schedule(self) -> None:
+        """Reload the changed plugins once there were no changes for delay seconds"""
+
+        if self.handle is not None:
+            self.handle.cancel()
+
+        self.handle = self.loop.call_later(self.delay, self.start_reload)
+
+    def start_reload(self) -> None:
+        # The loop only keeps weak references to tasks
+        task = self.loop.create_task(self.reload_changed())
+        task.add_done_callback(self.reload_tasks.discard)
+        self.reload_tasks.add(task)
+
+    async def reload_changed(self) -> None:
+        self.handle = None
+
+        async with self.lock:
+            changed = sorted(self.changed)
+            self.changed.clear()
+
+            for filepath in changed:
+                if filepath.name.lower().endswith(".py"):
+                    await self.marcel.hot_reload_plugin(filepath)
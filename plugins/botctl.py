@@ -1,6 +1,7 @@
 from marcel import Marcel
 from marcel.util import embed_message
 import discord
+import time
 
 class MarcelPlugin:
     """
@@ -29,6 +30,8 @@ class MarcelPlugin:
     `{prefix}unload` [plugin] unload given plugin
     `{prefix}save-settings` save server settings
     `{prefix}server-list` get the list of servers the bot is in
+    `{prefix}latency` [commands/events/reset] show the slowest commands and event handlers
+    `{prefix}stalls` [stack] show the recent event loop stalls (and the stack of the last one)
     """
 
     bot_commands = [
@@ -36,9 +39,13 @@ class MarcelPlugin:
         ("reload", "reload_cmd", "clean_command"),
         ("unload", "unload_cmd", "clean_command"),
         ("save-settings", "save_settings_cmd", "clean_command"),
-        ("server-list", "server_list_cmd", "clean_command")
+        ("server-list", "server_list_cmd", "clean_command"),
+        ("latency", "latency_cmd", "clean_command"),
+        ("stalls", "stalls_cmd", "clean_command")
     ]
 
+    latency_lines = 15
+
     def __init__(self, marcel: Marcel):
         self.marcel = marcel
 
@@ -73,12 +80,24 @@ class MarcelPlugin:
         ctlmsg = await message.channel.send(embed=ctlembed)
 
         try:
-            loaded_plugins = self.marcel.reload_plugins()
-            ctlembed = embed_message(
-                "Reload complete",
-                discord.Color.green(),
-                "{} plugins loaded".format(loaded_plugins)
-            )
+            results = await self.marcel.broadcast_action("reload-all")
+            errors = self.format_errors(results)
+
+            if errors:
+                ctlembed = embed_message(
+                    "Reload failed",
+                    discord.Color.dark_red(),
+                    errors
+                )
+
+            else:
+                ctlembed = embed_message(
+                    "Reload complete",
+                    discord.Color.green(),
+                    "{} plugins loaded".format(
+                        ", ".join(str(result) for _, result, _ in results)
+                    )
+                )
 
         except Exception as e:
             ctlembed = embed_message(
@@ -179,13 +198,27 @@ class MarcelPlugin:
 
         await self.send_unknown_plugin(message.channel, kwargs.get("settings"))
 
+    def format_errors(self, results: list) -> str:
+        """Return the errors of the results of Marcel.broadcast_action (one per line)"""
+
+        if len(results) == 1:
+            return results[0][2]
+
+        return "\n".join(
+            "Worker {}: {}".format(worker_id, error)
+            for worker_id, _, error in results if error
+        )
+
     async def save_settings_cmd(self, message: discord.Message, args: list, **kwargs):
         if not self.marcel.is_member_owner(message.author):
             await self.send_owner_only_message(message.channel, kwargs.get("settings"))
             return
 
         try:
-            self.marcel.save_server_settings()
+            errors = self.format_errors(await self.marcel.broadcast_action("save-settings"))
+            if errors:
+                raise Exception(errors)
+
             await message.channel.send(
                 embed=embed_message(
                     "Server settings saved",
@@ -212,18 +245,43 @@ class MarcelPlugin:
         server_list = list()
         server_count = 0
         total_members = 0
+        shards = list()
+
+        results = await self.marcel.broadcast_action("server-list")
 
-        for guild in self.marcel.guilds:
-            server_list.append(
-                "{}{} ({} members)".format(
-                    guild.name,
-                    ": {}".format(guild.description) if guild.description else "",
-                    guild.member_count
+        for _, result, _ in results:
+            if result is None:
+                continue
+
+            for guild in result["guilds"]:
+                server_list.append(
+                    "{}{} ({} members)".format(
+                        guild["name"],
+                        ": {}".format(guild["description"]) if guild["description"] else "",
+                        guild["member_count"]
+                    )
                 )
-            )
 
-            total_members += guild.member_count
-            server_count += 1
+                total_members += guild["member_count"]
+                server_count += 1
+
+            shards += result["shards"]
+
+        if len(shards) > 1:
+            server_list.append("")
+            for shard in sorted(shards, key=lambda x: x["shard_id"]):
+                server_list.append("Shard {}: {} servers, {} members, {} players, {:.0f}ms".format(
+                    shard["shard_id"],
+                    shard["guilds"],
+                    shard["members"],
+                    shard["media_players"],
+                    shard["latency"] * 1000
+                ))
+
+        errors = self.format_errors(results)
+        if errors:
+            server_list.append("")
+            server_list.append(errors)
 
         await message.channel.send(
             "Bot is in {} servers ({} members)\n```\n{}\n```".format(
@@ -232,4 +290,94 @@ class MarcelPlugin:
                 "\n".join(server_list)
             ),
             delete_after=kwargs.get("settings").get("delete_after")
+        )
+
+    async def latency_cmd(self, message: discord.Message, args: list, **kwargs):
+        if not self.marcel.is_member_owner(message.author):
+            await self.send_owner_only_message(message.channel, kwargs.get("settings"))
+            return
+
+        request = " ".join(args).strip().lower()
+
+        if request == "reset":
+            self.marcel.reset_latency_stats()
+            await message.channel.send(
+                embed=embed_message(
+                    "Latency statistics reset",
+                    discord.Color.green()
+                ),
+                delete_after=kwargs.get("settings").get("delete_after")
+            )
+            return
+
+        if request.startswith("command"):
+            kind = "command"
+        elif request.startswith("event"):
+            kind = "event"
+        else:
+            kind = None
+
+        stats = self.marcel.get_latency_stats(kind)
+        lines = ["{:<28} {:>7} {:>5} {:>9} {:>9} {:>9}".format(
+            "name", "count", "err", "p50 ms", "p95 ms", "p99 ms"
+        )]
+
+        for stat in stats[:self.latency_lines]:
+            lines.append("{:<28} {:>7} {:>5} {:>9.2f} {:>9.2f} {:>9.2f}".format(
+                "{}{}".format("" if stat["kind"] == "command" else "@", stat["name"])[:28],
+                stat["count"],
+                stat["errors"],
+                stat["p50"] * 1000,
+                stat["p95"] * 1000,
+                stat["p99"] * 1000
+            ))
+
+        await message.channel.send(
+            "Slowest {} (by total time, {} tracked)\n```\n{}\n```".format(
+                {"command": "commands", "event": "event handlers"}.get(kind, "commands and event handlers"),
+                len(stats),
+                "\n".join(lines)
+            ),
+            delete_after=kwargs.get("settings").get("delete_after")
+        )
+
+    async def stalls_cmd(self, message: discord.Message, args: list, **kwargs):
+        if not self.marcel.is_member_owner(message.author):
+            await self.send_owner_only_message(message.channel, kwargs.get("settings"))
+            return
+
+        stalls = self.marcel.get_stalls()
+
+        if len(stalls) == 0:
+            await message.channel.send(
+                embed=embed_message(
+                    "No event loop stall detected",
+                    discord.Color.green(),
+                    "" if self.marcel.cfg.get("watchdog", dict()).get("enabled", False) else "The watchdog is disabled"
+                ),
+                delete_after=kwargs.get("settings").get("delete_after")
+            )
+            return
+
+        now = time.time()
+        lines = list()
+        for stall in reversed(stalls):
+            lines.append("{:>6.0f}s ago {:>8.3f}s  {}".format(
+                now - stall["time"],
+                stall["duration"],
+                stall["location"]
+            ))
+
+        if " ".join(args).strip().lower() == "stack":
+            lines.append("")
+            lines.append("Last stall:")
+            lines += [x.rstrip() for x in stalls[-1]["stack"]]
+
+        content = "\n".join(lines)
+        if len(content) > 1900:
+            content = "...{}".format(content[-1900:])
+
+        await message.channel.send(
+            "Recent event loop stalls\n```\n{}\n```".format(content),
+            delete_after=kwargs.get("settings").get("delete_after")
         )
\ No newline at end of file
@@ -40,14 +40,20 @@ class MarcelPlugin:
         self.marcel = marcel
 
         self.nicknames_file = self.marcel.cfg_path.joinpath("nicknames.json")
+        self.nicknames = list()
+        self.greets = list()
 
+    def read_nicknames(self) -> dict:
         try:
             with self.nicknames_file.open('r') as h:
-                contents = json.load(h)
+                return json.load(h)
 
         except Exception as e:
             logging.error("Nicknames: {}".format(e))
-            contents = dict()
+            return dict()
+
+    async def on_load(self):
+        contents = await self.marcel.loop.run_in_executor(None, self.read_nicknames)
 
         self.nicknames = contents.get("nicknames", list())
         self.greets = contents.get("greets", list())
@@ -48,13 +48,20 @@ class MarcelPlugin:
 
     def __init__(self, marcel: Marcel):
         self.marcel = marcel
+        self.messages = list()
+        self.index = 0
+        self.count = 0
 
+    def read_messages(self) -> list:
         messages_file = self.marcel.cfg_path.joinpath("rich_presence.json")
         if messages_file.exists():
             with messages_file.open("r") as h:
-                self.messages = json.load(h)
-        else:
-            self.messages = list()
+                return json.load(h)
+
+        return list()
+
+    async def on_load(self):
+        self.messages = await self.marcel.loop.run_in_executor(None, self.read_messages)
 
         for message in self.messages:
             message["text"] = message.get("text", "")
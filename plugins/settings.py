@@ -159,8 +159,7 @@ class MarcelPlugin:
             await self.send_admin_only_message(message.channel, settings)
             return
 
-        del self.marcel.server_settings[str(message.guild.id)]
-        settings = self.marcel.get_server_settings(message.guild)
+        settings = self.marcel.reset_server_settings(message.guild)
 
         await message.channel.send(
             embed=embed_message(
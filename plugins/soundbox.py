@@ -51,13 +51,21 @@ class MarcelPlugin:
 
         self.sounds = list()
 
+    async def on_load(self):
+        self.sounds = await self.marcel.loop.run_in_executor(None, self.scan_sounds)
+
+    def scan_sounds(self) -> list:
+        sounds = list()
+
         for filename in self.sounds_path.iterdir():
             for ext in self.media_extensions:
                 if filename.name.lower().endswith(ext):
-                    if not filename in self.sounds:
-                        self.sounds.append(filename)
+                    if not filename in sounds:
+                        sounds.append(filename)
                         break
 
+        return sounds
+
     async def send_empty_soundbox(self, channel: discord.TextChannel):
         await channel.send(
             embed=embed_message(
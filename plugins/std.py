@@ -1,6 +1,6 @@
 from marcel import Marcel, __version__
 from marcel.util import embed_message
-import youtube_dl
+from marcel.voice import import_youtube_dl
 import discord
 import logging
 
@@ -48,7 +48,7 @@ class MarcelPlugin:
                 "Pong!",
                 discord.Color.orange(),
                 message="in {}ms".format(
-                    int(self.marcel.latency * 1000)
+                    int(self.marcel.get_guild_latency(message.guild) * 1000)
                 )
             ),
             delete_after=kwargs.get("settings").get("delete_after")
@@ -58,6 +58,7 @@ class MarcelPlugin:
         embed = embed_message("Marcel", discord.Color.blue())
         embed.add_field(name="marcel-the-bot", value=__version__, inline=False)
         embed.add_field(name="discord.py", value=discord.__version__, inline=False)
+        youtube_dl = await self.marcel.loop.run_in_executor(None, import_youtube_dl)
         embed.add_field(name="youtube-dlc", value=youtube_dl.version.__version__, inline=False)
         await message.channel.send(embed=embed)
 
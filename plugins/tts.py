@@ -43,9 +43,11 @@ class MarcelPlugin:
 
     def __init__(self, marcel: Marcel):
         self.marcel = marcel
+        self.langs = dict()
 
+    async def on_load(self):
         logging.info("Fetching Google TTS langs...")
-        self.langs = gtts.lang.tts_langs()
+        self.langs = await self.marcel.loop.run_in_executor(None, gtts.lang.tts_langs)
         logging.info("Done fetching Google TTS langs")
 
     def generate_tts(self, text: str, lang: str, filename: str):
@@ -12,6 +12,14 @@ class MarcelPlugin:
     # the "help" command
     plugin_help = """`{prefix}ping` pongs! :clap:"""
 
+    # Set this to True if the plugin's event handlers must run one after
+    # another, even when the bot runs event handlers concurrently
+    ordered_events = False
+
+    # Gateway intents (see discord.Intents) the plugin needs besides the ones
+    # of the events it handles, for example ["members"] to access guild.members
+    plugin_intents = []
+
     # List of tuples in the form (command, target function, ...)
     # There can be attributes after the target function:
     #    "clean_command" tells the bot to delete the command message
@@ -32,6 +40,14 @@ class MarcelPlugin:
         # You can log anything using the logging module
         logging.debug("Hello world!")
 
+    async def on_load(self):
+        # This optional function is run once the plugin is loaded, concurrently
+        # with the other plugins, use it for slow initializations (network,
+        # files...) instead of __init__
+        # The plugin's commands answer that it is warming up and its event
+        # handlers are not called until it completes
+        pass
+
     def on_unload(self):
         # This function will be called by the bot when unloading the plugin
         # You can use it to stop background tasks for example
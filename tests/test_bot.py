@@ -0,0 +1,93 @@
+from pathlib import Path
+from marcel import ShardedMarcel
+import discord
+import asyncio
+import logging
+import tempfile
+import json
+import unittest
+
+"""
+    Marcel the Discord Bot
+    Copyright (C) 2019-2020  akrocynova
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+class ApplyIntentsTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmpdir.name)
+        self.path.joinpath("plugins").mkdir()
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.log_handlers = list(logging.getLogger().handlers)
+
+    def tearDown(self) -> None:
+        logging.getLogger().handlers = self.log_handlers
+        asyncio.set_event_loop(None)
+        self.loop.close()
+        self.tmpdir.cleanup()
+
+    def create_marcel(self, cache_cfg: dict = None) -> ShardedMarcel:
+        with self.path.joinpath("config.json").open("w") as h:
+            json.dump({
+                "token": "",
+                "logging": {"level": "critical"},
+                "cache": cache_cfg or dict()
+            }, h)
+
+        return ShardedMarcel(self.path, self.path.joinpath("plugins"))
+
+    def get_intents(self, **enabled) -> discord.Intents:
+        intents = discord.Intents.none()
+        intents.guilds = True
+        intents.voice_states = True
+
+        for intent, value in enabled.items():
+            setattr(intents, intent, value)
+
+        return intents
+
+    def test_member_cache_flags_follow_intents(self) -> None:
+        marcel = self.create_marcel()
+        intents = self.get_intents()
+        marcel.apply_intents(intents)
+
+        flags = marcel._connection._member_cache_flags
+        self.assertEqual(flags.value, discord.MemberCacheFlags.from_intents(intents).value)
+        self.assertFalse(flags.joined)
+        self.assertFalse(flags.online)
+        self.assertTrue(flags.voice)
+        self.assertFalse(marcel._connection._chunk_guilds)
+
+    def test_member_cache_configuration(self) -> None:
+        marcel = self.create_marcel({"member_cache": {"voice": False}})
+        marcel.apply_intents(self.get_intents(members=True))
+
+        flags = marcel._connection._member_cache_flags
+        self.assertTrue(flags.joined)
+        self.assertFalse(flags.voice)
+
+    def test_member_cache_flag_requires_intent(self) -> None:
+        marcel = self.create_marcel({"member_cache": {"joined": True}})
+        marcel.apply_intents(self.get_intents())
+
+        self.assertFalse(marcel._connection._member_cache_flags.joined)
+
+    def test_chunk_guilds_with_members_intent(self) -> None:
+        marcel = self.create_marcel()
+        marcel.apply_intents(self.get_intents(members=True))
+
+        self.assertTrue(marcel._connection._chunk_guilds)
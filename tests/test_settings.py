@@ -0,0 +1,64 @@
+from pathlib import Path
+from marcel.settings import SqliteSettingsStore
+import asyncio
+import tempfile
+import unittest
+
+"""
+    Marcel the Discord Bot
+    Copyright (C) 2019-2020  akrocynova
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+class SqliteSettingsStoreTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmpdir.name).joinpath("servers.db")
+        self.loop = asyncio.new_event_loop()
+        self.store = self.create_store()
+
+    def tearDown(self) -> None:
+        self.loop.close()
+        self.tmpdir.cleanup()
+
+    def create_store(self) -> SqliteSettingsStore:
+        store = SqliteSettingsStore(self.path, {"prefix": "!", "volume": 1.0}, cache_size=1)
+        store.load()
+
+        return store
+
+    def test_mutate_after_eviction_then_flush(self) -> None:
+        settings = self.store.get("1")
+
+        # Evict guild 1 while its settings are still held
+        self.store.get("2")
+        self.assertNotIn("1", self.store.cache)
+
+        settings["volume"] = 0.5
+        self.loop.run_until_complete(self.store.flush())
+
+        self.assertEqual(self.store.get("1")["volume"], 0.5)
+        self.assertEqual(self.create_store().get("1")["volume"], 0.5)
+
+    def test_get_returns_evicted_settings_in_use(self) -> None:
+        settings = self.store.get("1")
+        self.store.get("2")
+        settings["prefix"] = "?"
+
+        self.assertIs(self.store.get("1"), settings)
+        self.assertEqual(self.store.get("1")["prefix"], "?")
+
+if __name__ == "__main__":
+    unittest.main()